@@ -1,16 +1,42 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+import os
 import logging
-from utils import query_parser, data_fetcher, data_analyzer, summarizer
+from utils import (
+    query_parser, data_fetcher, data_analyzer, summarizer, http_client, batch_planner, metrics,
+    correlation_engine, serialization, circuit_breaker, analytics_index, admission
+)
+from utils.serialization import FastJSONResponse
+from utils.dataset_cache import dataset_cache
+from utils.response_cache import response_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Maximum number of questions accepted by /query/batch
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100"))
+
+# Set to 0 to stop adding per-stage Server-Timing headers to responses
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "1") != "0"
+
+# Analysis sections streamed by /query/stream, in emission order
+STREAM_ANALYSIS_SECTIONS = [
+    "rainfall_analysis",
+    "crop_analysis",
+    "correlation_analysis",
+    "correlation_matrix",
+    "state_comparison",
+    "trend_analysis",
+]
+
 app = FastAPI(
     title="GovData Insight API",
     description="Intelligent Q&A system for Indian agricultural data from data.gov.in",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -20,6 +46,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Collect per-stage spans for this request and report them in a Server-Timing header"""
+    spans = metrics.start_request()
+    response = await call_next(request)
+    if SERVER_TIMING_ENABLED and spans:
+        response.headers["Server-Timing"] = metrics.server_timing(spans)
+    return response
+
+@app.on_event("startup")
+async def warm_dataset_cache():
+    """Serve the first queries from on-disk snapshots written by earlier workers"""
+    loaded = await run_in_threadpool(data_fetcher.warm_from_snapshots)
+    logger.info(f"Loaded {loaded} dataset snapshot(s) at startup")
+
+@app.on_event("shutdown")
+async def release_resources():
+    """Release pooled upstream connections and correlation workers"""
+    await http_client.close()
+    correlation_engine.shutdown_pool()
+
 @app.get("/")
 def root():
     """Health check endpoint"""
@@ -39,10 +86,143 @@ def health_check():
             "Natural language query processing",
             "Live data.gov.in integration",
             "Rainfall-crop correlation analysis",
-            "Multi-state agricultural comparison"
-        ]
+            "Multi-state agricultural comparison",
+            "Batch queries with shared fetch and analysis",
+            "Streaming query responses (NDJSON / SSE)"
+        ],
+        "dataset_cache": dataset_cache.stats(),
+        "analytics_index": analytics_index.stats(),
+        "response_cache": response_cache.stats(),
+        "circuit_breakers": circuit_breaker.stats(),
+        "admission": admission.stats()
     }
 
+@app.get("/metrics")
+def prometheus_metrics():
+    """Per-stage latency histograms, upstream counters and cache statistics in Prometheus format"""
+    return PlainTextResponse(
+        metrics.render({
+            "dataset_cache": dataset_cache.stats(),
+            "analytics_index": analytics_index.stats(),
+            "response_cache": response_cache.stats(),
+            "admission_fetch": admission.fetch_stage.stats(),
+            "admission_analysis": admission.analysis_stage.stats()
+        }),
+        media_type="text/plain; version=0.0.4"
+    )
+
+def query_priority(entities, versions=None):
+    """
+    Admission lane of a question.
+
+    Questions answered from the pre-aggregated rollups (climate, comparison,
+    ranking and other general questions, and correlation questions whose
+    matrices are already computed) take the fast lane; trends compute
+    per-series statistics and take the normal lane; correlation questions
+    whose matrices are not computed yet queue behind everything else.
+    """
+    analysis_type = entities.get("analysis_type")
+    if analysis_type == "correlation":
+        if correlation_engine.is_cached(versions, query_parser.year_window(entities)):
+            return admission.FAST
+        return admission.LOW
+    if analysis_type == "trend":
+        return admission.NORMAL
+    return admission.FAST
+
+async def fetch(entities, priority):
+    """
+    Fetch data for the given entities.
+
+    Fetches that may go upstream first wait for a fetch slot; data already
+    in memory is returned without queueing.
+
+    Raises:
+        admission.Overloaded (429/503 with Retry-After) when the fetch stage is saturated
+    """
+    if data_fetcher.is_warm(entities):
+        return await data_fetcher.fetch_data_async(entities)
+    async with admission.fetch_stage.slot(priority):
+        return await data_fetcher.fetch_data_async(entities)
+
+async def analyze(datasets, entities, priority=None):
+    """
+    Analyze fetched data for the given entities, reusing cached results.
+
+    CPU-bound pandas work runs off the event loop, at most
+    ADMISSION_ANALYSIS_CONCURRENCY at a time. Results are cached per
+    canonical entities and dataset version, so equivalent questions over the
+    same data skip analysis and summary building (and the queue) entirely.
+
+    Returns:
+        Tuple of (analysis_result, summary_template)
+
+    Raises:
+        admission.Overloaded (429/503 with Retry-After) when the analysis stage is saturated
+    """
+    versions = datasets.get("versions")
+    cached = response_cache.get(entities, versions)
+    if cached is not None:
+        return cached.analysis, cached.summary
+    if priority is None:
+        priority = query_priority(entities, versions)
+    async with admission.analysis_stage.slot(priority):
+        with metrics.span("analysis"):
+            analysis_result = await run_in_threadpool(data_analyzer.perform_analysis, datasets, entities)
+        with metrics.span("summary"):
+            template = summarizer.summary_template(analysis_result)
+    response_cache.put(entities, versions, analysis_result, template)
+    return analysis_result, template
+
+def query_result(query, entities, analysis_result, template, datasets, fmt):
+    """
+    Response body for one answered question, shared by /query and /query/batch.
+
+    With the "columnar" format every table of the analysis is sent as
+    column arrays; the rest of the body keeps its shape.
+    """
+    if fmt == "columnar":
+        analysis_result = serialization.columnar(analysis_result)
+    return {
+        "query": query,
+        "entities": entities,
+        "analysis": analysis_result,
+        "summary": summarizer.render_summary(template, query),
+        "citations": datasets["sources"],
+        "data_source": datasets.get("data_source", "mock"),
+        "data_age": datasets.get("data_age")
+    }
+
+async def request_body(request):
+    """Parse a JSON object request body, rejecting anything else with 400"""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be valid JSON")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON object")
+    return data
+
+def query_text(data):
+    """Validate the "query" field of a query request body"""
+    query = data.get("query", "")
+    if not isinstance(query, str):
+        raise HTTPException(status_code=400, detail="Query must be a string")
+    query = query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    return query
+
+def response_format(data):
+    """Validate the optional "format" field of a query request body"""
+    requested = data.get("format") or "records"
+    if requested not in serialization.RESPONSE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"format must be one of: {', '.join(serialization.RESPONSE_FORMATS)}"
+        )
+    return requested
+
 @app.post("/query")
 async def handle_query(request: Request):
     """
@@ -50,7 +230,8 @@ async def handle_query(request: Request):
 
     Request body:
     {
-        "query": "Your question about agricultural data"
+        "query": "Your question about agricultural data",
+        "format": "records"  // optional; "columnar" returns tables as column arrays
     }
 
     Returns:
@@ -60,43 +241,191 @@ async def handle_query(request: Request):
         "analysis": {...},
         "summary": "Human-readable summary",
         "citations": [...],
-        "data_source": "live or mock"
+        "data_source": "live, stale or mock",
+        "data_age": {"rainfall": seconds, "crop": seconds}  // null for mock data
     }
+
+    Returns 429 (stage queue full) or 503 (waited too long for a slot) with
+    a Retry-After header when the server is saturated.
     """
     try:
-        data = await request.json()
-        query = data.get("query", "").strip()
-
-        if not query:
-            raise HTTPException(status_code=400, detail="Query cannot be empty")
+        data = await request_body(request)
+        query = query_text(data)
+        fmt = response_format(data)
 
         logger.info(f"Processing query: {query}")
 
         # Step 1: Parse entities (state, crop, years, analysis_type)
-        entities = query_parser.extract_entities(query)
+        with metrics.span("parse"):
+            entities = query_parser.extract_entities(query)
         logger.info(f"Extracted entities: {entities}")
 
         # Step 2: Fetch data (live + mock fallback)
-        datasets = data_fetcher.fetch_data(entities)
+        with metrics.span("fetch"):
+            datasets = await fetch(entities, query_priority(entities))
         logger.info(f"Data source: {datasets.get('data_source', 'unknown')}")
 
-        # Step 3: Analyze data
-        analysis_result = data_analyzer.perform_analysis(datasets, entities)
+        # Step 3: Analyze data, reusing the result for equivalent questions
+        analysis_result, template = await analyze(datasets, entities)
 
-        # Step 4: Summarize and format output
-        summary = summarizer.generate_summary(analysis_result, query)
-
-        return {
-            "query": query,
-            "entities": entities,
-            "analysis": analysis_result,
-            "summary": summary,
-            "citations": datasets["sources"],
-            "data_source": datasets.get("data_source", "mock")
-        }
+        # Step 4: Summarize and format output (only the echoed query is rendered per request)
+        return serialization.json_response(
+            request, query_result(query, entities, analysis_result, template, datasets, fmt)
+        )
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+def _stream_event(event, data, sse, fmt="records"):
+    """Encode one stream event as an SSE frame or an NDJSON line"""
+    if fmt == "columnar":
+        data = serialization.columnar(data)
+    if sse:
+        return b"event: " + event.encode() + b"\ndata: " + serialization.dumps(data) + b"\n\n"
+    return serialization.dumps({"event": event, "data": data}) + b"\n"
+
+@app.post("/query/stream")
+async def handle_query_stream(request: Request):
+    """
+    Process a natural language query, streaming each stage as soon as it is ready.
+
+    Request body is the same as /query. The response is NDJSON (one
+    {"event": ..., "data": ...} object per line), or Server-Sent Events when
+    the client sends "Accept: text/event-stream". With "format": "columnar"
+    tables are sent as column arrays. Events, in order:
+    entities, data_source, one event per analysis section
+    (rainfall_analysis, crop_analysis, correlation_analysis,
+    correlation_matrix, state_comparison, trend_analysis when present),
+    summary, then done.
+    A failure after streaming has started is reported as an error event
+    (with "retry_after" if the server is saturated).
+    """
+    data = await request_body(request)
+    query = query_text(data)
+    fmt = response_format(data)
+
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    with metrics.span("parse"):
+        entities = query_parser.extract_entities(query)
+
+    # Reject with a proper 429 while that is still possible
+    if not data_fetcher.is_warm(entities):
+        admission.fetch_stage.check(query_priority(entities))
+
+    async def events():
+        try:
+            logger.info(f"Streaming query: {query}")
+
+            yield _stream_event("entities", {"query": query, "entities": entities}, sse)
+
+            with metrics.span("fetch"):
+                datasets = await fetch(entities, query_priority(entities))
+            yield _stream_event("data_source", {
+                "data_source": datasets.get("data_source", "mock"),
+                "data_age": datasets.get("data_age"),
+                "citations": datasets["sources"]
+            }, sse)
+
+            analysis_result, template = await analyze(datasets, entities)
+            for section in STREAM_ANALYSIS_SECTIONS:
+                if section in analysis_result:
+                    yield _stream_event(section, analysis_result[section], sse, fmt)
+
+            yield _stream_event("summary", {
+                "summary": summarizer.render_summary(template, query),
+                "analysis_type": analysis_result.get("analysis_type")
+            }, sse)
+            yield _stream_event("done", {}, sse)
+        except admission.Overloaded as e:
+            logger.warning(f"Streaming query rejected: {e.detail}")
+            yield _stream_event("error", {"detail": e.detail, "retry_after": e.retry_after}, sse)
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}", exc_info=True)
+            yield _stream_event("error", {"detail": f"Error processing query: {str(e)}"}, sse)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def handle_query_batch(request: Request):
+    """
+    Process many natural language queries with one shared fetch and analysis plan.
+
+    Request body:
+    {
+        "queries": ["First question", "Second question", ...],
+        "format": "records"  // optional; "columnar" returns tables as column arrays
+    }
+
+    Returns:
+    {
+        "results": [{"query": ..., "entities": ..., "analysis": ..., "summary": ..., "citations": ..., "data_source": ..., "data_age": ...}, ...],
+        "data_source": "live, stale or mock",
+        "data_age": {"rainfall": seconds, "crop": seconds},
+        "plan": {"queries": N, "unique": M}
+    }
+    """
+    try:
+        data = await request_body(request)
+        queries = [str(q).strip() for q in (data.get("queries") or [])]
+
+        if not queries or not all(queries):
+            raise HTTPException(status_code=400, detail="Queries must be a non-empty list of non-empty strings")
+        if len(queries) > BATCH_MAX_QUERIES:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+        fmt = response_format(data)
+
+        logger.info(f"Processing batch of {len(queries)} queries")
+
+        # Step 1: Parse every query and plan one fetch covering all of them
+        with metrics.span("parse"):
+            entities_list = query_parser.extract_entities_batch(queries)
+        merged_entities, groups = batch_planner.plan_batch(entities_list)
+        logger.info(f"Batch plan: {len(groups)} unique entity sets, fetch {merged_entities}")
+
+        # Step 2: Fetch each resource once for the whole batch (batches use the low-priority lane)
+        with metrics.span("fetch"):
+            datasets = await fetch(merged_entities, admission.LOW)
+
+        # Step 3: Analyze each unique entity set once; all share the same analytics index.
+        # Each takes its own low-priority analysis slot, so /query is served in between
+        analyses = {}
+        for key, positions in groups.items():
+            entities = entities_list[positions[0]]
+            try:
+                analyses[key] = await analyze(data_fetcher.for_query(datasets, entities), entities, admission.LOW)
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.error(f"Error analyzing batch entry {key}: {e}")
+                analyses[key] = e
+
+        # Step 4: Summarize per query
+        results = []
+        for query, entities in zip(queries, entities_list):
+            analyzed = analyses[batch_planner.entity_key(entities)]
+            if isinstance(analyzed, Exception):
+                results.append({"query": query, "entities": entities, "error": str(analyzed)})
+                continue
+            analysis_result, template = analyzed
+            results.append(query_result(query, entities, analysis_result, template, datasets, fmt))
+
+        return serialization.json_response(request, {
+            "results": results,
+            "data_source": datasets.get("data_source", "mock"),
+            "data_age": datasets.get("data_age"),
+            "plan": {"queries": len(queries), "unique": len(groups)}
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing batch: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
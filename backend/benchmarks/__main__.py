@@ -0,0 +1,47 @@
+"""
+Offline benchmark suite.
+
+Run from the backend directory:
+
+    python -m benchmarks micro --output micro.json
+    python -m benchmarks load --requests 1000 --concurrency 32 --latency 0.02
+    python -m benchmarks all --crop-rows 1000000 --output results.json
+"""
+import argparse
+
+from . import report
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the query pipeline offline")
+    parser.add_argument("suite", choices=["micro", "load", "all"])
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    parser.add_argument("--rainfall-rows", type=int, default=10_000)
+    parser.add_argument("--crop-rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20, help="Iterations per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--distinct", type=int, default=100, help="Distinct questions in the load mix")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake upstream latency per response (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fake upstream 503 rate")
+    parser.add_argument("--padding", type=int, default=0, help="Extra payload bytes per upstream record")
+    parser.add_argument("--no-response-cache", action="store_true", help="Disable the /query response cache")
+    parser.add_argument("--url", help="Drive an already running backend instead of an in-process app")
+    args = parser.parse_args()
+
+    results = {}
+    if args.suite in ("micro", "all"):
+        from . import micro
+        results["micro"] = micro.run(args.rainfall_rows, args.crop_rows, args.repeat)
+    if args.suite in ("load", "all"):
+        from . import load
+        results["load"] = load.run(
+            requests=args.requests, concurrency=args.concurrency, distinct=args.distinct, url=args.url,
+            rainfall_rows=args.rainfall_rows, crop_rows=args.crop_rows, latency=args.latency,
+            failure_rate=args.failure_rate, padding=args.padding, response_cache=not args.no_response_cache,
+        )
+    report.write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
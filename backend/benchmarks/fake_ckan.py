@@ -0,0 +1,200 @@
+"""
+Local stand-in for the data.gov.in CKAN datastore and export endpoints.
+
+Serves deterministic synthetic rainfall and crop data (see synthetic.py)
+with configurable row counts, per-response latency, payload padding and
+injected failures, so the fetch pipeline can be benchmarked offline:
+
+    python -m benchmarks.fake_ckan --crop-rows 1000000 --latency 0.05 --failure-rate 0.02
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from . import synthetic
+
+RAINFALL_RESOURCE = "synthetic-rainfall"
+CROP_RESOURCE = "synthetic-crop"
+
+# Rows are generated in chunks of this size when evaluating filters
+_SCAN_CHUNK = 1_000_000
+
+
+class FakeCkanConfig:
+    """Behaviour of the fake server."""
+
+    def __init__(self, rainfall_rows=10_000, crop_rows=100_000, latency=0.0, failure_rate=0.0,
+                 padding=0, seed=0, etag="synthetic-v1"):
+        self.rows = {RAINFALL_RESOURCE: rainfall_rows, CROP_RESOURCE: crop_rows}
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.padding = padding
+        self.etag = etag
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            failed = self.failure_rate > 0 and self.random.random() < self.failure_rate
+            self.failures += failed
+            return failed
+
+
+def _columns_at(resource, index):
+    return synthetic.rainfall_at(index) if resource == RAINFALL_RESOURCE else synthetic.crop_at(index)
+
+
+@lru_cache(maxsize=64)
+def _matching_rows(resource, total, filters_json):
+    """Row indices matching CKAN ``filters``, evaluated chunk by chunk."""
+    filters = json.loads(filters_json)
+    wanted = {}
+    for column, names in filters.items():
+        names = names if isinstance(names, list) else [names]
+        vocabulary = synthetic.STATES if column == "State" else synthetic.CROPS
+        wanted[column] = [vocabulary.index(n) for n in names if n in vocabulary]
+    matches = []
+    for start in range(0, total, _SCAN_CHUNK):
+        index = np.arange(start, min(start + _SCAN_CHUNK, total), dtype=np.int64)
+        columns = _columns_at(resource, index)
+        mask = np.ones(len(index), dtype=bool)
+        for column, codes in wanted.items():
+            if column in columns:
+                mask &= np.isin(columns[column], codes)
+        matches.append(index[mask])
+    return np.concatenate(matches) if matches else np.empty(0, dtype=np.int64)
+
+
+def _page(config, resource, offset, limit, filters=None, fields=None):
+    """Return (records, total) for one page of ``resource``."""
+    total = config.rows[resource]
+    if filters:
+        rows = _matching_rows(resource, total, json.dumps(filters, sort_keys=True))
+        total = len(rows)
+        index = rows[offset:offset + limit]
+    else:
+        index = np.arange(min(offset, total), min(offset + limit, total), dtype=np.int64)
+    columns = _columns_at(resource, index)
+    if fields:
+        columns = {name: values for name, values in columns.items() if name in fields}
+    records = synthetic.to_records(columns)
+    if config.padding:
+        pad = "x" * config.padding
+        for record in records:
+            record["Notes"] = pad
+    return records, total
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", config.etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if config.latency:
+                time.sleep(config.latency)
+            if config.should_fail():
+                self._send_json(503, {"error": "injected failure"})
+                return
+            if self.headers.get("If-None-Match") == config.etag:
+                self.send_response(304)
+                self.send_header("ETag", config.etag)
+                self.end_headers()
+                return
+
+            url = urlsplit(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/api/datastore/resource.json":
+                resource = params.get("resource_id")
+                if resource not in config.rows:
+                    self._send_json(404, {"error": "unknown resource"})
+                    return
+                filters = json.loads(params["filters"]) if params.get("filters") else None
+                fields = params["fields"].split(",") if params.get("fields") else None
+                records, total = _page(config, resource, int(params.get("offset", 0)),
+                                       int(params.get("limit", 100)), filters, fields)
+                self._send_json(200, {"success": True, "result": {"records": records, "total": total}})
+            elif url.path in ("/export/rainfall.json", "/export/crop.json"):
+                resource = RAINFALL_RESOURCE if "rainfall" in url.path else CROP_RESOURCE
+                records, _ = _page(config, resource, 0, config.rows[resource])
+                self._send_json(200, {"records": records})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+    return Handler
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """
+    Start the fake server on a background thread.
+
+    Args:
+        config: FakeCkanConfig
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+
+    Returns:
+        Tuple of (server, base_url); call server.shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-ckan", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def environment(base_url):
+    """Environment variables pointing the backend at a fake server."""
+    return {
+        "DATA_GOV_API_KEY": "benchmark",
+        "CKAN_DATASTORE_URL": f"{base_url}/api/datastore/resource.json",
+        "RAINFALL_RESOURCE_ID": RAINFALL_RESOURCE,
+        "CROP_PRODUCTION_RESOURCE_ID": CROP_RESOURCE,
+        "RAINFALL_EXPORT_API": f"{base_url}/export/rainfall.json",
+        "CROP_PRODUCTION_EXPORT_API": f"{base_url}/export/crop.json",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic data.gov.in data locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rainfall-rows", type=int, default=10_000)
+    parser.add_argument("--crop-rows", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--padding", type=int, default=0, help="Extra bytes of payload per record")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = FakeCkanConfig(args.rainfall_rows, args.crop_rows, args.latency, args.failure_rate, args.padding, args.seed)
+    server, base_url = start_server(config, args.host, args.port)
+    print(f"Fake CKAN serving on {base_url}; point the backend at it with:")
+    for name, value in environment(base_url).items():
+        print(f"  export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import time
+import asyncio
+import logging
+import tempfile
+
+import httpx
+
+from . import fake_ckan, synthetic
+from .report import summarize
+
+
+def build_queries(count, seed=0):
+    """Deterministic mix of questions over the synthetic states and crops."""
+    templates = [
+        "Compare rainfall in {s1} and {s2}",
+        "{c} production trend in {s1} over {y} years",
+        "Correlation between rainfall and {c} in {s1}",
+        "Which state has the highest {c} production?",
+        "Rainfall in {s1}",
+    ]
+    queries = []
+    for i in range(count):
+        k = i * 7 + seed
+        queries.append(templates[i % len(templates)].format(
+            s1=synthetic.STATES[k % len(synthetic.STATES)],
+            s2=synthetic.STATES[(k * 3 + 1) % len(synthetic.STATES)],
+            c=synthetic.CROPS[k % len(synthetic.CROPS)],
+            y=3 + k % 8,
+        ))
+    return queries
+
+
+async def _drive(client, queries, concurrency):
+    latencies, statuses = [], {}
+    pending = iter(queries)
+
+    async def worker():
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/query", json={"query": query})
+                status = response.status_code
+            except httpx.HTTPError:
+                status = "error"
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def run(requests=500, concurrency=16, distinct=100, url=None, rainfall_rows=10_000, crop_rows=100_000,
+        latency=0.0, failure_rate=0.0, padding=0, response_cache=True):
+    """
+    Drive /query end to end and report throughput and latency percentiles.
+
+    Without ``url`` the app runs in-process against a local fake CKAN server
+    (the environment is configured before the backend is imported); with
+    ``url`` an already running backend is driven over HTTP.
+
+    Returns:
+        Dictionary with throughput, latency summary, status counts and,
+        in-process, the fake upstream's request/failure counts
+    """
+    queries = build_queries(distinct)
+    workload = [queries[i % len(queries)] for i in range(requests)]
+    result = {"requests": requests, "concurrency": concurrency, "distinct_queries": distinct}
+
+    if url:
+        async def remote():
+            async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+                return await _drive(client, workload, concurrency)
+        latencies, statuses, elapsed = asyncio.run(remote())
+    else:
+        config = fake_ckan.FakeCkanConfig(rainfall_rows, crop_rows, latency, failure_rate, padding)
+        server, base_url = fake_ckan.start_server(config)
+        os.environ.update(fake_ckan.environment(base_url))
+        os.environ.setdefault("SNAPSHOT_DIR", tempfile.mkdtemp(prefix="govdata-bench-"))
+        if not response_cache:
+            os.environ["RESPONSE_CACHE_MAX_ENTRIES"] = "0"
+        import app as backend
+        # Per-request INFO logs would dominate the measurement
+        logging.getLogger().setLevel(logging.WARNING)
+
+        async def local():
+            transport = httpx.ASGITransport(app=backend.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                # First request loads both datasets; measured separately from steady state
+                start = time.perf_counter()
+                await client.post("/query", json={"query": workload[0]})
+                result["cold_request_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                return await _drive(client, workload, concurrency)
+
+        try:
+            latencies, statuses, elapsed = asyncio.run(local())
+        finally:
+            server.shutdown()
+        result["upstream"] = {"requests": config.requests, "injected_failures": config.failures,
+                              "rows": {"rainfall": rainfall_rows, "crop": crop_rows}}
+
+    result.update({
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency": summarize(latencies),
+        "status": statuses,
+    })
+    return result
@@ -0,0 +1,111 @@
+import time
+
+from utils import analytics_index, data_analyzer, query_parser
+
+from . import synthetic
+from .report import summarize
+
+# Representative questions covering every analysis type and entity kind
+QUERIES = [
+    "Compare rainfall in Punjab and Kerala",
+    "Kerala vs Punjab rainfall",
+    "Rice production trend in Punjab over 3 years",
+    "What is the correlation between rainfall and paddy in Orissa and Tamilnadu?",
+    "Which state has the highest wheat production?",
+    "Wheat output in Ludhiana over the last 10 years",
+    "Monsoon rainfall in Andhra Pradesh and Arunachal Pradesh",
+    "Agricultural overview of West Bengal, Bihar and Assam",
+]
+
+# Questions whose parse must not change: (query, expected entity values)
+PARSER_CHECKS = [
+    ("Which crops grow best in Karnataka", {"states": ["Karnataka"], "crops": [], "analysis_type": "ranking"}),
+    ("Rice production growth in Punjab", {"crops": ["Rice"], "analysis_type": "trend"}),
+    ("Rainfall in Kerala til 2020", {"crops": [], "analysis_type": "climate"}),
+    ("Price of pepper per gram in Kerala", {"crops": [], "analysis_type": "general"}),
+    ("Gram production in Rajasthan", {"states": ["Rajasthan"], "crops": ["Gram"]}),
+    ("Green gram and black pepper in Kerala", {"crops": ["Moong", "Black Pepper"]}),
+    ("Tur dal prices in Maharashtra", {"states": ["Maharashtra"], "crops": []}),
+    ("Rainfall on the Krishna river", {"states": [], "districts": []}),
+    ("Rainfall in Krishna district", {"states": ["Andhra Pradesh"], "districts": ["Krishna"]}),
+]
+
+ANALYSES = [
+    {"states": ["Punjab", "Kerala"], "crops": [], "years": 5, "analysis_type": "comparison"},
+    {"states": ["Punjab"], "crops": ["Rice"], "years": 10, "analysis_type": "trend"},
+    {"states": [], "crops": [], "years": 5, "analysis_type": "correlation"},
+    {"states": synthetic.STATES[:12], "crops": ["Wheat", "Rice", "Maize"], "years": 25, "analysis_type": "general"},
+]
+
+
+def _time(fn, repeat, min_time=0.0):
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < repeat or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def check_parser():
+    """
+    Check the parse of PARSER_CHECKS against the active gazetteer.
+
+    Raises:
+        ValueError naming every question that parsed differently
+    """
+    failures = []
+    for query, expected in PARSER_CHECKS:
+        entities = query_parser.extract_entities(query)
+        wrong = {key: entities[key] for key, value in expected.items() if entities[key] != value}
+        if wrong:
+            failures.append(f"{query!r}: got {wrong}, expected {expected}")
+    if failures:
+        raise ValueError("Parser checks failed: " + "; ".join(failures))
+    return len(PARSER_CHECKS)
+
+
+def bench_extract_entities(repeat=2000):
+    """Per-query entity extraction latency over the representative questions."""
+    check_parser()
+    samples = []
+    for query in QUERIES:
+        samples.extend(_time(lambda: query_parser.extract_entities(query), repeat // len(QUERIES)))
+    return summarize(samples)
+
+
+def bench_perform_analysis(rainfall_rows, crop_rows, repeat=20):
+    """
+    Analysis latency with a cold analytics index (first request for a data
+    version) and a warm one (every later request).
+    """
+    datasets = synthetic.datasets(rainfall_rows, crop_rows)
+    results = {}
+
+    def cold():
+        analytics_index._indexes.clear()
+        data_analyzer.perform_analysis(datasets, ANALYSES[0])
+
+    results["cold_index"] = summarize(_time(cold, max(3, repeat // 5)))
+    for entities in ANALYSES:
+        key = f"warm_{entities['analysis_type']}"
+        results[key] = summarize(_time(lambda: data_analyzer.perform_analysis(datasets, entities), repeat))
+    return results
+
+
+def bench_calculate_correlation(rainfall_rows, crop_rows, repeat=20):
+    """Correlation over raw frames (no analytics index)."""
+    data = synthetic.datasets(rainfall_rows, crop_rows)
+    df_rain, df_crop = data["base"]["rainfall"].to_frame(), data["base"]["crop"].to_frame()
+    return summarize(_time(lambda: data_analyzer.calculate_correlation(df_rain, df_crop), repeat))
+
+
+def run(rainfall_rows=10_000, crop_rows=100_000, repeat=20):
+    """Run every micro-benchmark and return their results."""
+    return {
+        "rows": {"rainfall": rainfall_rows, "crop": crop_rows},
+        "extract_entities": bench_extract_entities(),
+        "perform_analysis": bench_perform_analysis(rainfall_rows, crop_rows, repeat),
+        "calculate_correlation": bench_calculate_correlation(rainfall_rows, crop_rows, repeat),
+    }
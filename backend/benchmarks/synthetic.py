@@ -0,0 +1,120 @@
+import os
+import json
+
+import numpy as np
+
+from utils.columnar import ColumnarDataset
+
+# Every state/UT and crop known to the query parser
+_GAZETTEER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "utils", "gazetteer.json")
+with open(_GAZETTEER, encoding="utf-8") as f:
+    _vocabulary = json.load(f)
+
+STATES = list(_vocabulary["states"])
+CROPS = list(_vocabulary["crops"])
+FIRST_YEAR = 1997
+YEARS = 25
+
+
+def _noise(index, salt):
+    """Deterministic pseudo-random integers in [0, 1000) for each row index."""
+    mixed = (index.astype(np.uint64) * np.uint64(2654435761) + np.uint64(salt * 97)) % np.uint64(2 ** 32)
+    return (mixed >> np.uint64(8)).astype(np.int64) % 1000
+
+
+def rainfall_columns(start, stop):
+    """Rainfall rows ``start``..``stop`` as column arrays (see rainfall_at)."""
+    return rainfall_at(np.arange(start, stop, dtype=np.int64))
+
+
+def rainfall_at(index):
+    """
+    Rainfall rows at the given row indices as column arrays.
+
+    Rows cycle through years fastest, then states; rows beyond
+    len(STATES) * YEARS are further observation stations for the same
+    state and year, so any row count is valid.
+
+    Returns:
+        Dictionary of numpy arrays: State (codes into STATES), Year, Rainfall
+    """
+    state = (index // YEARS) % len(STATES)
+    year = FIRST_YEAR + index % YEARS
+    # Each state has its own climate, a slow drift over the years and per-row noise
+    base = 400 + (state * 37 % 23) * 90
+    drift = (year - FIRST_YEAR) * ((state % 5) - 2) * 3
+    rainfall = base + drift + _noise(index, 1) / 5 - 100
+    return {"State": state.astype(np.int32), "Year": year, "Rainfall": np.round(rainfall, 1)}
+
+
+def crop_columns(start, stop):
+    """Crop production rows ``start``..``stop`` as column arrays (see crop_at)."""
+    return crop_at(np.arange(start, stop, dtype=np.int64))
+
+
+def crop_at(index):
+    """
+    Crop production rows at the given row indices as column arrays.
+
+    Rows cycle through years, then states, then crops; rows beyond
+    len(STATES) * len(CROPS) * YEARS are further districts.
+
+    Returns:
+        Dictionary of numpy arrays: State and Crop (codes), Year, Production
+    """
+    state = (index // YEARS) % len(STATES)
+    crop = (index // (YEARS * len(STATES))) % len(CROPS)
+    year = FIRST_YEAR + index % YEARS
+    base = 100 + ((state * 13 + crop * 7) % 50) * 100
+    growth = (year - FIRST_YEAR) * ((state + crop) % 7 - 3) * 4
+    production = np.maximum(base + growth + _noise(index, 2) // 4 - 125, 0)
+    return {"State": state.astype(np.int32), "Crop": crop.astype(np.int32), "Year": year, "Production": production}
+
+
+def _categories(columns):
+    categories = {"State": STATES}
+    if "Crop" in columns:
+        categories["Crop"] = CROPS
+    return categories
+
+
+def to_records(columns):
+    """Decode column arrays into CKAN-style record dicts."""
+    decoded = {}
+    for name, values in columns.items():
+        if name == "State":
+            decoded[name] = [STATES[v] for v in values.tolist()]
+        elif name == "Crop":
+            decoded[name] = [CROPS[v] for v in values.tolist()]
+        else:
+            decoded[name] = values.tolist()
+    names = list(decoded)
+    return [dict(zip(names, row)) for row in zip(*decoded.values())]
+
+
+def to_dataset(columns, version):
+    """Wrap column arrays as a ColumnarDataset without going through records."""
+    kinds = {name: "category" if name in ("State", "Crop") else ("int" if values.dtype.kind == "i" else "float")
+             for name, values in columns.items()}
+    return ColumnarDataset(columns, kinds, _categories(columns), version=version)
+
+
+def datasets(rainfall_rows, crop_rows):
+    """
+    Build a data_fetcher-style datasets dictionary of synthetic data.
+
+    Args:
+        rainfall_rows: Number of rainfall rows
+        crop_rows: Number of crop production rows
+
+    Returns:
+        Dictionary with 'base', 'versions' and 'sources'
+    """
+    rainfall = to_dataset(rainfall_columns(0, rainfall_rows), f"synthetic-rain:{rainfall_rows}")
+    crop = to_dataset(crop_columns(0, crop_rows), f"synthetic-crop:{crop_rows}")
+    return {
+        "sources": [],
+        "data_source": "synthetic",
+        "base": {"rainfall": rainfall, "crop": crop},
+        "versions": {"rainfall": rainfall.version, "crop": crop.version},
+    }
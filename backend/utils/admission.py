@@ -0,0 +1,194 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from . import metrics
+
+# Concurrent queries allowed to fetch from upstream / run analysis. Analysis
+# is CPU-bound, but one slot per core lets a single slow analysis (a cold
+# correlation build) hold every core while cheap questions queue into 503s;
+# a few slots beyond the core count trade slightly slower individual analyses
+# for far fewer rejections. Keep it well below the threadpool size (40).
+ADMISSION_FETCH_CONCURRENCY = int(os.getenv("ADMISSION_FETCH_CONCURRENCY", "8"))
+ADMISSION_ANALYSIS_CONCURRENCY = int(os.getenv("ADMISSION_ANALYSIS_CONCURRENCY", str(max(4, 2 * (os.cpu_count() or 2)))))
+
+# Queries allowed to wait for a slot per stage, and for how long (seconds)
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "2"))
+
+# Priority lanes; lower values are admitted first. FAST is for questions
+# answered from pre-aggregated rollups, NORMAL for per-series work (trends),
+# LOW for cold correlation builds and batches.
+FAST = 0
+NORMAL = 1
+LOW = 2
+
+# Smoothing factor of the per-stage service time estimate used for Retry-After
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(HTTPException):
+    """
+    A query was refused because a pipeline stage is saturated.
+
+    429 when the stage's queue is full, 503 when the query waited
+    ADMISSION_MAX_WAIT without getting a slot. Both carry Retry-After.
+    """
+
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """
+    Bounded concurrency for one pipeline stage with a prioritised, bounded queue.
+
+    Up to ``concurrency`` queries run the stage at once; the rest wait for at
+    most ``max_wait`` seconds. Waiters are served in arrival order, with each
+    lane below FAST counted as arriving a quarter of ``max_wait`` later, so
+    cheap queries overtake heavy ones but a heavy query that has waited long
+    enough is no longer starved by a steady stream of cheap ones. A full
+    queue rejects newcomers immediately, unless a newcomer is in a higher
+    lane than a queued query, which is then rejected in its place so cheap
+    queries are never shut out by a backlog of heavy ones. Rejecting early keeps
+    admitted queries within their latency budget, so throughput of useful
+    answers holds steady under overload instead of every query timing out.
+    """
+
+    def __init__(self, name, concurrency, max_queue=ADMISSION_MAX_QUEUE, max_wait=ADMISSION_MAX_WAIT):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self._lane_delay = max_wait / 4
+        self._service_time = None
+        self.admitted = 0
+        self.rejected = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up, for the Retry-After header."""
+        service_time = self._service_time if self._service_time is not None else self.max_wait
+        drain = service_time * (len(self._waiters) + 1) / self.concurrency
+        return min(60, max(1, math.ceil(drain)))
+
+    def _reject(self, status_code, reason):
+        return Overloaded(status_code, f"Server busy ({self.name} stage {reason}); retry later", self.retry_after())
+
+    def _lowest(self):
+        """The newest waiter of the lowest lane, the first to be shed."""
+        return max(self._waiters, key=lambda entry: (entry[2], entry[1])) if self._waiters else None
+
+    def check(self, priority=NORMAL):
+        """
+        Raise Overloaded (429) if a query of ``priority`` would be rejected right now.
+
+        Lets streaming responses fail with a proper status before they start.
+        """
+        if self.active < self.concurrency or len(self._waiters) < self.max_queue:
+            return
+        lowest = self._lowest()
+        if lowest is None or lowest[2] <= priority:
+            self.rejected += 1
+            raise self._reject(429, "queue full")
+
+    @asynccontextmanager
+    async def slot(self, priority=NORMAL):
+        """Hold one slot of this stage for the enclosed block, waiting for it if needed."""
+        start = time.perf_counter()
+        await self._acquire(priority)
+        metrics.observe(f"queue.{self.name}", time.perf_counter() - start)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if self._service_time is None:
+                self._service_time = elapsed
+            else:
+                self._service_time += _SERVICE_TIME_ALPHA * (elapsed - self._service_time)
+            self._release()
+
+    async def _acquire(self, priority):
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            worst = self._lowest()
+            if worst is None or worst[2] <= priority:
+                self.rejected += 1
+                raise self._reject(429, "queue full")
+            # Shed the newest query of the lowest lane to make room for this one
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            self.shed += 1
+            worst[3].set_exception(self._reject(429, "queue full"))
+
+        future = asyncio.get_running_loop().create_future()
+        rank = time.monotonic() + priority * self._lane_delay
+        entry = (rank, next(self._order), priority, future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._discard(entry)
+            self.timed_out += 1
+            raise self._reject(503, f"wait exceeded {self.max_wait:g}s")
+        except BaseException:
+            self._discard(entry)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Granted a slot just as the caller went away; pass it on
+                self._release()
+            raise
+        self.admitted += 1
+
+    def _discard(self, entry):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def _release(self):
+        # Hand the slot straight to the next waiter so it cannot be taken by a newcomer
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[3]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        """Current occupancy and admission counters."""
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "service_seconds": round(self._service_time or 0.0, 4),
+        }
+
+
+# Upstream fetches for data not already in memory
+fetch_stage = StageLimiter("fetch", ADMISSION_FETCH_CONCURRENCY)
+# Analysis of questions not answered from the response cache
+analysis_stage = StageLimiter("analysis", ADMISSION_ANALYSIS_CONCURRENCY)
+
+
+def stats():
+    """Per-stage admission statistics."""
+    return {stage.name: stage.stats() for stage in (fetch_stage, analysis_stage)}
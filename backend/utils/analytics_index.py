@@ -0,0 +1,240 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import query_parser
+from .columnar import as_frame
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_INDEX_MAX_ENTRIES = int(os.getenv("ANALYTICS_INDEX_MAX_ENTRIES", "8"))
+
+# Rows whose dataset has no Year column are grouped under this sentinel year
+NO_YEAR = -1
+
+
+class AggregateIndex:
+    """
+    Pre-aggregated sum/mean/min/max/count of one value column.
+
+    Aggregates are kept at the finest grain the questions need (e.g. per
+    state, crop and year) and rolled up on demand, so a request only touches
+    the handful of groups it selects instead of every raw row.
+
+    Every aggregate is mergeable, so rows appended to a dataset are folded
+    in with merge() at a cost proportional to the new rows and the number of
+    groups rather than the size of the dataset.
+    """
+
+    def __init__(self, frame, keys, value, label=None):
+        self.keys = list(keys)
+        self.value = value
+        self.label = label
+        self._set_table(self._aggregate(frame))
+
+    def _aggregate(self, frame):
+        """Aggregate raw rows to the index grain."""
+        required = [k for k in self.keys if k != "Year"] + [self.value]
+        if any(col not in frame.columns for col in required):
+            names = " and ".join(f"'{col}'" for col in required)
+            raise ValueError(f"{self.label or self.value} data must contain {names} columns")
+        frame = frame.copy(deep=False)
+        if "Year" in self.keys:
+            if "Year" in frame.columns:
+                frame["Year"] = pd.to_numeric(frame["Year"], errors="coerce").fillna(NO_YEAR)
+            else:
+                frame["Year"] = NO_YEAR
+        frame[self.value] = pd.to_numeric(frame[self.value], errors="coerce")
+        grouped = frame.groupby(self.keys, observed=True, sort=True)[self.value]
+        table = grouped.agg(["sum", "min", "max", "count"]).reset_index()
+        table = table[table["count"] > 0]
+        for key in self.keys:
+            if isinstance(table[key].dtype, pd.CategoricalDtype):
+                table[key] = table[key].astype(str)
+        return table
+
+    def _set_table(self, table):
+        self.table = table
+        self._lower = {
+            key: self.table[key].str.lower()
+            for key in self.keys if key != "Year"
+        }
+
+    def merge(self, frame):
+        """
+        Return a new index that also covers the rows of ``frame``.
+
+        The index itself is left untouched, since it may still be serving
+        requests for the previous dataset version.
+        """
+        delta = self._aggregate(frame)
+        merged = AggregateIndex.__new__(AggregateIndex)
+        merged.keys, merged.value, merged.label = self.keys, self.value, self.label
+        if delta.empty:
+            merged._set_table(self.table)
+            return merged
+        table = pd.concat([self.table, delta], ignore_index=True).groupby(self.keys, sort=True).agg(
+            sum=("sum", "sum"), min=("min", "min"), max=("max", "max"), count=("count", "sum")
+        ).reset_index()
+        merged._set_table(table)
+        return merged
+
+    def select(self, filters=None, years=None):
+        """
+        Select the aggregate rows matching ``filters`` and the last ``years`` years.
+
+        Args:
+            filters: Optional {key: [values]} matched case-insensitively
+            years: Optional size of the trailing year window
+
+        Returns:
+            DataFrame of matching aggregate rows
+        """
+        mask = np.ones(len(self.table), dtype=bool)
+        for key, wanted in (filters or {}).items():
+            if wanted and key in self._lower:
+                mask &= self._lower[key].isin([w.lower() for w in wanted]).to_numpy()
+        selected = self.table[mask]
+        if years and "Year" in self.keys and not selected.empty:
+            latest = selected["Year"].max()
+            if latest != NO_YEAR:
+                selected = selected[selected["Year"] > latest - years]
+        return selected
+
+    def rollup(self, by, filters=None, years=None):
+        """
+        Combine selected aggregates up to the ``by`` keys.
+
+        Returns:
+            DataFrame with columns ``by`` + sum, min, max, count, mean
+        """
+        selected = self.select(filters, years)
+        rolled = selected.groupby(by, sort=True).agg(
+            sum=("sum", "sum"), min=("min", "min"), max=("max", "max"), count=("count", "sum")
+        ).reset_index()
+        rolled["mean"] = rolled["sum"] / rolled["count"]
+        return rolled
+
+
+class AnalyticsIndex:
+    """Rainfall and production aggregates for one version of each dataset."""
+
+    def __init__(self, rainfall, production):
+        self.rainfall = rainfall
+        self.production = production
+        self.has_crop = "Crop" in production.keys
+
+    @classmethod
+    def from_frames(cls, df_rain, df_crop):
+        return cls(_rainfall_index(df_rain), _production_index(df_crop))
+
+
+def _rainfall_index(frame):
+    return AggregateIndex(frame, ["State", "Year"], "Rainfall", label="Rainfall")
+
+
+def _production_index(frame):
+    keys = ["State", "Crop", "Year"] if "Crop" in frame.columns else ["State", "Year"]
+    return AggregateIndex(frame, keys, "Production", label="Crop")
+
+
+_lock = threading.Lock()
+_indexes = OrderedDict()
+incremental_builds = 0
+full_builds = 0
+
+
+def _cached(key, build):
+    with _lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = build()
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > ANALYTICS_INDEX_MAX_ENTRIES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _versioned_index(kind, dataset, build):
+    """
+    Return the cached index of one dataset version.
+
+    A version produced by appending a delta to a version whose index is
+    still cached is indexed by merging the delta into that index; anything
+    else is built from every row.
+    """
+    def build_version():
+        global incremental_builds, full_builds
+        if dataset.lineage is not None:
+            parent_version, delta = dataset.lineage
+            with _lock:
+                parent = _indexes.get((kind, parent_version))
+            if parent is not None:
+                try:
+                    index = parent.merge(delta.to_frame())
+                    incremental_builds += 1
+                    return index
+                except ValueError as e:
+                    logger.warning(f"Rebuilding {kind} index for {dataset.version}: {e}")
+        full_builds += 1
+        return build(dataset.to_frame())
+
+    return _cached((kind, dataset.version), build_version)
+
+
+def stats():
+    """Cached index count and how many indexes were merged from a delta or built in full."""
+    with _lock:
+        entries = len(_indexes)
+    return {"entries": entries, "incremental_builds": incremental_builds, "full_builds": full_builds}
+
+
+def _rows(datasets, name, entities):
+    """Rows of an unversioned dataset: as given, or the rows of 'base' matching ``entities``."""
+    if name in datasets:
+        return datasets[name]
+    dataset = datasets["base"][name]
+    if not entities:
+        return dataset
+    crops = entities.get("crops") if name == "crop" else None
+    return dataset.take(dataset.filter_mask(entities.get("states"), crops, query_parser.year_window(entities)))
+
+
+def get_index(datasets, entities=None):
+    """
+    Return the analytics index for the datasets returned by data_fetcher.
+
+    Indexes are built once per dataset version and reused by every request
+    that sees the same version; versions extended by an incremental refresh
+    reuse the previous version's aggregates. Datasets without version
+    information (e.g. hand-built record lists) get an uncached index over
+    the rows the question selects, which are only filtered out of the full
+    datasets in that case.
+
+    Args:
+        datasets: Dictionary from data_fetcher.fetch_data (or with 'rainfall'
+            and 'crop' as ColumnarDatasets or record lists)
+        entities: Optional entities of the question, used to select the rows
+            of unversioned datasets
+
+    Returns:
+        AnalyticsIndex
+    """
+    base = datasets.get("base") or {}
+    rain, crop = base.get("rainfall"), base.get("crop")
+    if rain is not None and crop is not None and rain.version and crop.version:
+        rainfall = _versioned_index("rainfall", rain, _rainfall_index)
+        production = _versioned_index("crop", crop, _production_index)
+        return AnalyticsIndex(rainfall, production)
+
+    rain, crop = _rows(datasets, "rainfall", entities), _rows(datasets, "crop", entities)
+    # Keep the expected columns even when the filters selected no rows
+    df_rain = as_frame(rain) if len(rain) else pd.DataFrame(columns=["State", "Rainfall"])
+    df_crop = as_frame(crop) if len(crop) else pd.DataFrame(columns=["State", "Production"])
+    return AnalyticsIndex.from_frames(df_rain, df_crop)
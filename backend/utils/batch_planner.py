@@ -0,0 +1,79 @@
+from .query_parser import year_window
+
+
+def entity_key(entities):
+    """
+    Canonical, hashable form of extracted entities.
+
+    Queries phrased differently but resolving to the same states, crops,
+    window and analysis type share a key.
+
+    Args:
+        entities: Dictionary from query_parser.extract_entities
+
+    Returns:
+        Tuple usable as a dictionary key
+    """
+    return (
+        tuple(sorted(entities.get("states") or [])),
+        tuple(sorted(entities.get("crops") or [])),
+        year_window(entities),
+        entities.get("analysis_type", "general"),
+    )
+
+
+def merge_requirements(entities_list):
+    """
+    Merge the data requirements of many queries into one fetch.
+
+    States and crops are unioned; if any query is unconstrained on a
+    dimension the merged fetch is unconstrained on it too. The year window
+    is the widest one requested, or every year if any query set none.
+
+    Args:
+        entities_list: List of entity dictionaries
+
+    Returns:
+        Entity dictionary describing the single fetch that serves every query
+    """
+    states, crops = [], []
+    all_states = all_crops = all_years = False
+    years = None
+    for entities in entities_list:
+        if entities.get("states"):
+            states.extend(s for s in entities["states"] if s not in states)
+        else:
+            all_states = True
+        if entities.get("crops"):
+            crops.extend(c for c in entities["crops"] if c not in crops)
+        else:
+            all_crops = True
+        window = year_window(entities)
+        if window:
+            years = max(years or 0, window)
+        else:
+            all_years = True
+    return {
+        "states": [] if all_states else states,
+        "crops": [] if all_crops else crops,
+        "years": None if all_years else years,
+        "years_explicit": not all_years and years is not None,
+        "analysis_type": "general",
+    }
+
+
+def plan_batch(entities_list):
+    """
+    Group queries by canonical entities and compute the shared fetch.
+
+    Args:
+        entities_list: List of entity dictionaries, one per query
+
+    Returns:
+        Tuple of (merged_entities, groups) where groups maps each entity key
+        to the list of query positions that share it
+    """
+    groups = {}
+    for position, entities in enumerate(entities_list):
+        groups.setdefault(entity_key(entities), []).append(position)
+    return merge_requirements(entities_list), groups
@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failed requests that open an endpoint's breaker
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+
+# Seconds before the first background probe of an open breaker (doubles after each failed probe)
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "15"))
+BREAKER_MAX_RESET_TIMEOUT = float(os.getenv("BREAKER_MAX_RESET_TIMEOUT", "300"))
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Request rejected without contacting the upstream because its breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream endpoint.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    requests fail fast with CircuitOpenError. While open, a background task
+    probes the endpoint every ``reset_timeout`` seconds (doubling up to
+    ``max_reset_timeout``); the first successful probe closes the breaker.
+    Live requests are never used as trial requests, so no query pays for
+    discovering that the upstream is still down.
+    """
+
+    def __init__(self, endpoint, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT, max_reset_timeout=BREAKER_MAX_RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(max_reset_timeout, reset_timeout)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self.probes = 0
+        self._probe = None
+        self._probe_task = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a request may be sent; counts and rejects it otherwise."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            self.rejected += 1
+        # Restart probing if the loop that ran the previous probe has gone away
+        self._ensure_probe()
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state == CLOSED:
+                return
+            self.state = CLOSED
+            self.opened_at = None
+        logger.info(f"Circuit closed for {self.endpoint}")
+
+    def record_failure(self, probe):
+        """
+        Count a failed request.
+
+        Args:
+            probe: Coroutine function returning True when the endpoint is
+                healthy again; used for background probing once open
+        """
+        with self._lock:
+            self._probe = probe
+            self.failures += 1
+            if self.state != CLOSED or self.failures < self.failure_threshold:
+                return
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+        logger.warning(f"Circuit opened for {self.endpoint} after {self.failures} consecutive failures")
+        self._ensure_probe()
+
+    def _ensure_probe(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        with self._lock:
+            if self.state == CLOSED or self._probe is None:
+                return
+            if self._probe_task is not None and not self._probe_task.done():
+                return
+            self._probe_task = loop.create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        delay = self.reset_timeout
+        while self.state != CLOSED:
+            await asyncio.sleep(delay)
+            if self.state == CLOSED:
+                return
+            self.probes += 1
+            try:
+                healthy = await self._probe()
+            except Exception as e:
+                logger.info(f"Probe of {self.endpoint} failed: {e}")
+                healthy = False
+            if healthy:
+                self.record_success()
+                return
+            delay = min(delay * 2, self.max_reset_timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "open_seconds": round(time.monotonic() - self.opened_at, 1) if self.opened_at else 0.0,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "probes": self.probes,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def endpoint_of(url):
+    """Breaker key for ``url``: scheme, host and path without the query string."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def get_breaker(url):
+    """Return the process-wide breaker guarding the endpoint of ``url``."""
+    endpoint = endpoint_of(url)
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+
+def stats():
+    """Per-endpoint breaker state and counters."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.endpoint: b.stats() for b in breakers}
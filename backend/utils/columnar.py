@@ -0,0 +1,254 @@
+import numpy as np
+import pandas as pd
+
+
+def _normalise_column(name):
+    return str(name).strip().capitalize()
+
+
+def _encode_column(values):
+    """Encode a column as int64, float64 or a dictionary-encoded string array."""
+    non_null = [v for v in values if v is not None and v != ""]
+    try:
+        if all(isinstance(v, int) or (isinstance(v, str) and v.strip().lstrip("-").isdigit()) for v in non_null) \
+                and len(non_null) == len(values):
+            return "int", np.asarray([int(v) for v in values], dtype=np.int64), None
+        floats = np.asarray([float(v) if v is not None and v != "" else np.nan for v in values], dtype=np.float64)
+        return "float", floats, None
+    except (TypeError, ValueError):
+        pass
+    categories = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        if v is None:
+            codes[i] = -1
+        else:
+            codes[i] = categories.setdefault(str(v).strip(), len(categories))
+    return "category", codes, list(categories)
+
+
+class ColumnarDataset:
+    """
+    Compact typed column store used as the canonical dataset type.
+
+    Numeric columns are int64/float64 numpy arrays; string columns (states,
+    crops, ...) are dictionary-encoded as int32 codes plus a category list,
+    with -1 marking missing values. Column names are normalised once when the
+    dataset is built. Arrays may be memory-mapped snapshot files, in which case
+    every worker shares the same pages.
+    """
+
+    __slots__ = ("arrays", "kinds", "categories", "version", "fetched_at", "baseline_at", "lineage")
+
+    def __init__(self, arrays, kinds, categories=None, version=None):
+        self.arrays = arrays
+        self.kinds = kinds
+        self.categories = categories or {}
+        self.version = version
+        # Epoch seconds of the last upstream fetch or revalidation (None for mock data)
+        self.fetched_at = None
+        # Epoch seconds of the last full (non-incremental) fetch of the resource
+        self.baseline_at = None
+        # (parent_version, delta) when built by appending ``delta`` to another version
+        self.lineage = None
+
+    @classmethod
+    def from_records(cls, records, rename=None, version=None, columns=None):
+        """
+        Build a dataset from a list of record dicts.
+
+        Args:
+            records: List of record dicts
+            rename: Optional mapping of upstream field name to canonical column name
+            version: Optional version tag
+            columns: Optional collection of upstream field names to keep (all by default)
+
+        Returns:
+            ColumnarDataset
+        """
+        rename = rename or {}
+        # Every record is scanned so a field first appearing late in a page is not dropped
+        names = {}
+        for record in records:
+            for name in record:
+                if name not in names and (columns is None or name in columns):
+                    names[name] = None
+        arrays, kinds, categories = {}, {}, {}
+        for name in names:
+            normalised = rename.get(name) or _normalise_column(name)
+            if normalised in arrays:
+                continue
+            kind, array, cats = _encode_column([r.get(name) for r in records])
+            arrays[normalised] = array
+            kinds[normalised] = kind
+            if cats is not None:
+                categories[normalised] = cats
+        return cls(arrays, kinds, categories, version)
+
+    @classmethod
+    def concat(cls, parts, version=None):
+        """
+        Concatenate datasets row-wise, e.g. chunks or pages of one resource.
+
+        Category dictionaries are merged and codes remapped; a column that is
+        int in one part and float in another becomes float, and a column that
+        is numeric in one part but categorical in another becomes categorical.
+        Columns missing from a part are filled with missing values.
+
+        Args:
+            parts: Iterable of ColumnarDatasets
+            version: Optional version tag for the result
+
+        Returns:
+            ColumnarDataset
+        """
+        parts = [p for p in parts if p]
+        if not parts:
+            return cls({}, {}, version=version)
+        if len(parts) == 1:
+            only = parts[0]
+            return cls(only.arrays, only.kinds, only.categories, version)
+
+        names = []
+        for part in parts:
+            names.extend(n for n in part.arrays if n not in names)
+
+        arrays, kinds, categories = {}, {}, {}
+        for name in names:
+            part_kinds = {part.kinds[name] for part in parts if name in part.arrays}
+            if "category" in part_kinds:
+                merged = {}
+                pieces = []
+                for part in parts:
+                    if name not in part.arrays:
+                        pieces.append(np.full(len(part), -1, dtype=np.int32))
+                        continue
+                    if part.kinds[name] == "category":
+                        values = part.categories[name]
+                        codes = np.asarray(part.arrays[name])
+                    else:
+                        # Numeric part of a categorical column: encode its values as strings
+                        values, codes = np.unique(np.asarray(part.arrays[name]), return_inverse=True)
+                        values = [str(v) for v in values.tolist()]
+                    lookup = np.asarray([merged.setdefault(v, len(merged)) for v in values] + [-1], dtype=np.int32)
+                    # Index -1 (missing) maps to the trailing -1 of the lookup table
+                    pieces.append(lookup[codes])
+                arrays[name] = np.concatenate(pieces)
+                kinds[name] = "category"
+                categories[name] = list(merged)
+            else:
+                kind = "int" if part_kinds == {"int"} and all(name in p.arrays for p in parts) else "float"
+                dtype = np.int64 if kind == "int" else np.float64
+                arrays[name] = np.concatenate([
+                    np.asarray(part.arrays[name], dtype=dtype) if name in part.arrays
+                    else np.full(len(part), np.nan)
+                    for part in parts
+                ])
+                kinds[name] = kind
+        return cls(arrays, kinds, categories, version)
+
+    def __len__(self):
+        if not self.arrays:
+            return 0
+        return len(next(iter(self.arrays.values())))
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    @property
+    def columns(self):
+        return list(self.arrays)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def take(self, mask):
+        """Return a new dataset holding only the rows selected by ``mask`` (None keeps everything)."""
+        if mask is None:
+            return self
+        return ColumnarDataset(
+            {name: np.asarray(array)[mask] for name, array in self.arrays.items()},
+            self.kinds,
+            self.categories,
+        )
+
+    def filter_mask(self, states=None, crops=None, years=None):
+        """
+        Build a vectorised row mask for states, crops and a trailing year window.
+
+        States and crops are matched case-insensitively against each column's
+        categories, so the string comparison runs once per distinct value
+        rather than once per row. The year window keeps the last ``years``
+        years present among the rows that survive the other filters.
+
+        Returns:
+            Boolean numpy mask, or None if no filter applies
+        """
+        if not self:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        applied = False
+
+        for column, wanted in (("State", states), ("Crop", crops)):
+            if not wanted or self.kinds.get(column) != "category":
+                continue
+            wanted_lower = {w.lower() for w in wanted}
+            codes = [i for i, c in enumerate(self.categories[column]) if c.lower() in wanted_lower]
+            mask &= np.isin(self.arrays[column], codes)
+            applied = True
+
+        if years and self.kinds.get("Year") in ("int", "float") and mask.any():
+            year = self.arrays["Year"]
+            latest = np.nanmax(year[mask])
+            mask &= year > latest - years
+            applied = True
+
+        return mask if applied else None
+
+    def to_frame(self):
+        """
+        Return a DataFrame over the columns without copying numeric data.
+
+        Categorical columns become pandas Categoricals built from their codes,
+        so strings are never materialised per row.
+        """
+        data = {}
+        for name, array in self.arrays.items():
+            if self.kinds[name] == "category":
+                data[name] = pd.Categorical.from_codes(np.asarray(array), categories=self.categories[name])
+            else:
+                data[name] = np.asarray(array)
+        return pd.DataFrame(data, copy=False)
+
+    def to_records(self):
+        """Materialise the rows as a list of record dicts."""
+        names = self.columns
+        decoded = []
+        for name in names:
+            array = self.arrays[name]
+            if self.kinds[name] == "category":
+                categories = self.categories[name]
+                decoded.append([categories[c] if c >= 0 else None for c in array.tolist()])
+            elif self.kinds[name] == "float":
+                decoded.append([None if v != v else v for v in array.tolist()])
+            else:
+                decoded.append(array.tolist())
+        return [dict(zip(names, row)) for row in zip(*decoded)]
+
+
+def as_frame(data):
+    """
+    Return a DataFrame for a ColumnarDataset or a list of record dicts.
+
+    Record lists get their column names capitalised, matching the
+    normalisation ColumnarDataset applies at ingestion.
+    """
+    if isinstance(data, ColumnarDataset):
+        return data.to_frame()
+    frame = pd.DataFrame(data)
+    frame.columns = [_normalise_column(col) for col in frame.columns]
+    return frame
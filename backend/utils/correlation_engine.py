@@ -0,0 +1,412 @@
+import os
+import logging
+import warnings
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Season lags (years) for which rainfall is correlated with later production
+CORRELATION_LAGS = [int(v) for v in os.getenv("CORRELATION_LAGS", "1").split(",") if v.strip()]
+# Bootstrap resamples behind each confidence interval
+CORRELATION_BOOTSTRAP_SAMPLES = int(os.getenv("CORRELATION_BOOTSTRAP_SAMPLES", "200"))
+# Series per shard, and the series count above which shards go to the process pool
+CORRELATION_SHARD_SIZE = int(os.getenv("CORRELATION_SHARD_SIZE", "256"))
+CORRELATION_PARALLEL_MIN_SERIES = int(os.getenv("CORRELATION_PARALLEL_MIN_SERIES", "1024"))
+CORRELATION_WORKERS = int(os.getenv("CORRELATION_WORKERS", str(os.cpu_count() or 1)))
+CORRELATION_CACHE_MAX_ENTRIES = int(os.getenv("CORRELATION_CACHE_MAX_ENTRIES", "32"))
+
+# Fewer paired observations than this give no coefficient
+MIN_OBSERVATIONS = 3
+
+# Fixed seed so the same data always yields the same intervals
+_BOOTSTRAP_SEED = 20240601
+
+# Resampled values held at once (rows x samples x years) while bootstrapping a shard
+_BOOTSTRAP_CHUNK_ELEMENTS = 1 << 21
+
+
+def pearson_rows(x, y):
+    """
+    Pearson correlation of ``x`` and ``y`` along the last axis.
+
+    Pairs where either value is NaN are ignored; rows with fewer than
+    MIN_OBSERVATIONS complete pairs (or no variance) yield NaN.
+
+    Returns:
+        Array of coefficients with the leading shape of ``x``
+    """
+    mask = ~(np.isnan(x) | np.isnan(y))
+    n = mask.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx = np.where(mask, x, 0.0).sum(axis=-1) / n
+        my = np.where(mask, y, 0.0).sum(axis=-1) / n
+        dx = np.where(mask, x - mx[..., None], 0.0)
+        dy = np.where(mask, y - my[..., None], 0.0)
+        r = (dx * dy).sum(axis=-1) / np.sqrt((dx * dx).sum(axis=-1) * (dy * dy).sum(axis=-1))
+    return np.where(n >= MIN_OBSERVATIONS, r, np.nan)
+
+
+def _rank_rows(matrix):
+    # Average ranks for ties; NaN stays NaN
+    return pd.DataFrame(matrix).rank(axis=1).to_numpy(dtype=np.float64)
+
+
+def spearman_rows(x, y):
+    """Spearman rank correlation of 2-D ``x`` and ``y`` row by row over complete pairs."""
+    missing = np.isnan(x) | np.isnan(y)
+    return pearson_rows(_rank_rows(np.where(missing, np.nan, x)), _rank_rows(np.where(missing, np.nan, y)))
+
+
+def lagged_rows(x, y, lag, years=None):
+    """
+    Pearson correlation of ``y`` against ``x`` from ``lag`` years earlier.
+
+    Columns are paired by year value, so a year missing from the data never
+    shifts the pairs; a column whose lagged year is absent is dropped.
+
+    Args:
+        years: Ascending year of each column (consecutive years by default)
+    """
+    if lag <= 0:
+        return pearson_rows(x, y)
+    years = np.arange(x.shape[1]) if years is None else np.asarray(years)
+    earlier = np.searchsorted(years, years - lag)
+    present = earlier < len(years)
+    present[present] = years[earlier[present]] == years[present] - lag
+    if not present.any():
+        return np.full(x.shape[0], np.nan)
+    return pearson_rows(x[:, earlier[present]], y[:, present])
+
+
+def bootstrap_rows(x, y, samples, seed=_BOOTSTRAP_SEED):
+    """
+    Percentile bootstrap 95% interval of the row-wise Pearson coefficient.
+
+    Every row is resampled with the same column indices, so all rows of a
+    shard are evaluated together, in chunks of resamples sized to keep
+    each (rows x chunk x columns) pass under _BOOTSTRAP_CHUNK_ELEMENTS.
+
+    Returns:
+        Tuple of (low, high) arrays
+    """
+    if samples <= 0 or x.shape[1] == 0:
+        empty = np.full(x.shape[0], np.nan)
+        return empty, empty
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, x.shape[1], size=(samples, x.shape[1]))
+    step = max(1, _BOOTSTRAP_CHUNK_ELEMENTS // max(1, x.shape[0] * x.shape[1]))
+    r = np.concatenate([
+        pearson_rows(x[:, picks[i:i + step]], y[:, picks[i:i + step]])
+        for i in range(0, samples, step)
+    ], axis=1)
+    with warnings.catch_warnings():
+        # Rows without enough observations are all-NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanpercentile(r, [2.5, 97.5], axis=1)
+    return low, high
+
+
+def correlate_shard(args):
+    """
+    Compute every metric for one shard of series.
+
+    Module-level so it can run in a worker process.
+
+    Args:
+        args: Tuple of (rainfall, production, lags, samples, years), both
+            matrices series-by-year and aligned row for row, ``years``
+            labelling their columns
+
+    Returns:
+        Dictionary of per-series arrays
+    """
+    x, y, lags, samples, years = args
+    low, high = bootstrap_rows(x, y, samples)
+    result = {
+        "pearson": pearson_rows(x, y),
+        "spearman": spearman_rows(x, y),
+        "n": (~(np.isnan(x) | np.isnan(y))).sum(axis=1),
+        "ci_low": low,
+        "ci_high": high,
+    }
+    for lag in lags:
+        result[f"lag_{lag}"] = lagged_rows(x, y, lag, years)
+    return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers never inherit the API's threads or locks
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, CORRELATION_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the worker processes (called on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def correlate_matrix(x, y, lags=None, samples=None, years=None):
+    """
+    Correlate aligned series-by-year matrices, sharding large inputs across processes.
+
+    Args:
+        x: Rainfall matrix (series x years)
+        y: Production matrix (series x years)
+        lags: Season lags to evaluate (defaults to CORRELATION_LAGS)
+        samples: Bootstrap resamples (defaults to CORRELATION_BOOTSTRAP_SAMPLES)
+        years: Ascending year of each column (consecutive years by default)
+
+    Returns:
+        Dictionary of per-series arrays (pearson, spearman, n, ci_low, ci_high, lag_<k>)
+    """
+    lags = CORRELATION_LAGS if lags is None else lags
+    samples = CORRELATION_BOOTSTRAP_SAMPLES if samples is None else samples
+    shards = [
+        (x[i:i + CORRELATION_SHARD_SIZE], y[i:i + CORRELATION_SHARD_SIZE], lags, samples, years)
+        for i in range(0, len(x), CORRELATION_SHARD_SIZE)
+    ]
+    if not shards:
+        return correlate_shard((x, y, lags, samples, years))
+
+    results = None
+    if len(x) >= CORRELATION_PARALLEL_MIN_SERIES and CORRELATION_WORKERS > 1 and len(shards) > 1:
+        try:
+            results = list(_get_pool().map(correlate_shard, shards))
+        except Exception as e:
+            logger.warning(f"Correlation process pool failed, computing inline: {e}")
+            shutdown_pool()
+    if results is None:
+        results = [correlate_shard(shard) for shard in shards]
+    return {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+
+def _window(years, window):
+    if window and len(years):
+        return years[years > years.max() - window]
+    return years
+
+
+def _matrix(table, keys, years, value):
+    wide = table.pivot_table(index=keys, columns="Year", values=value, aggfunc="sum")
+    wide = wide.reindex(columns=years)
+    return list(wide.index), wide.to_numpy(dtype=np.float64)
+
+
+def _round(value, digits=3):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _records(labels, keys, metrics, lags):
+    records = []
+    for i, label in enumerate(labels):
+        label = label if isinstance(label, tuple) else (label,)
+        record = dict(zip(keys, label))
+        record.update({
+            "Pearson": _round(metrics["pearson"][i]),
+            "Spearman": _round(metrics["spearman"][i]),
+            "CI_Low": _round(metrics["ci_low"][i]),
+            "CI_High": _round(metrics["ci_high"][i]),
+            "Observations": int(metrics["n"][i]),
+        })
+        for lag in lags:
+            record[f"Lag_{lag}_Pearson"] = _round(metrics[f"lag_{lag}"][i])
+        records.append(record)
+    return records
+
+
+def _year_records(year_values, rain, prod):
+    # Across states within each year (years become the rows)
+    x, y = rain.T.copy(), prod.T.copy()
+    mask_n = (~(np.isnan(x) | np.isnan(y))).sum(axis=1)
+    return [
+        {"Year": int(year), "Pearson": _round(p), "Spearman": _round(s), "Observations": int(n)}
+        for year, p, s, n in zip(year_values, pearson_rows(x, y), spearman_rows(x, y), mask_n)
+    ]
+
+
+def build_correlations(index, years=None, lags=None, samples=None):
+    """
+    Rainfall-vs-production correlations for every state, state/crop and year.
+
+    Per-state and per-crop coefficients correlate a series' yearly
+    production with its state's yearly average rainfall; per-year
+    coefficients correlate average rainfall with total production across
+    states within one year.
+
+    Args:
+        index: AnalyticsIndex for the current dataset versions
+        years: Optional trailing year window
+        lags: Season lags to evaluate (defaults to CORRELATION_LAGS)
+        samples: Bootstrap resamples (defaults to CORRELATION_BOOTSTRAP_SAMPLES)
+
+    Returns:
+        Dictionary with 'by_state', 'by_crop' and 'by_year' record lists, and
+        the matrices select() recomputes 'by_year' from under '_year_inputs'
+    """
+    lags = CORRELATION_LAGS if lags is None else lags
+    samples = CORRELATION_BOOTSTRAP_SAMPLES if samples is None else samples
+    rain = index.rainfall.table[index.rainfall.table["Year"] >= 0].copy()
+    prod = index.production.table[index.production.table["Year"] >= 0]
+    empty = {"lags": lags, "bootstrap_samples": samples, "by_state": [], "by_crop": [], "by_year": []}
+    if rain.empty or prod.empty:
+        return empty
+
+    rain["mean"] = rain["sum"] / rain["count"]
+    all_years = np.sort(np.union1d(rain["Year"].unique(), prod["Year"].unique()))
+    year_values = _window(all_years, years)
+    states, rain_matrix = _matrix(rain, ["State"], year_values, "mean")
+    row_of_state = {state: i for i, state in enumerate(states)}
+
+    def aligned(labels):
+        rows = [row_of_state.get(label[0] if isinstance(label, tuple) else label) for label in labels]
+        keep = [i for i, row in enumerate(rows) if row is not None]
+        return keep, rain_matrix[[rows[i] for i in keep]]
+
+    # Per-state totals
+    state_labels, state_prod = _matrix(prod, ["State"], year_values, "sum")
+    state_keep, state_rain = aligned(state_labels)
+    state_prod = state_prod[state_keep]
+    state_labels = [state_labels[i] for i in state_keep]
+    by_state = _records(state_labels, ["State"],
+                        correlate_matrix(state_rain, state_prod, lags, samples, year_values), lags)
+
+    # Per state and crop
+    by_crop = []
+    crop_labels, crop_prod = [], np.empty((0, len(year_values)))
+    if index.has_crop:
+        crop_labels, crop_prod = _matrix(prod, ["State", "Crop"], year_values, "sum")
+        keep, crop_rain = aligned(crop_labels)
+        crop_labels, crop_prod = [crop_labels[i] for i in keep], crop_prod[keep]
+        by_crop = _records(crop_labels, ["State", "Crop"],
+                           correlate_matrix(crop_rain, crop_prod, lags, samples, year_values), lags)
+
+    return {
+        "lags": lags,
+        "bootstrap_samples": samples,
+        "by_state": by_state,
+        "by_crop": by_crop,
+        "by_year": _year_records(year_values, state_rain, state_prod),
+        "_year_inputs": {
+            "years": year_values,
+            "states": state_labels,
+            "rain": state_rain,
+            "production": state_prod,
+            "crops": crop_labels,
+            "crop_production": crop_prod,
+        },
+    }
+
+
+_lock = threading.Lock()
+_results = OrderedDict()
+
+
+def _cache_key(versions, years):
+    if not versions or not all(versions.values()):
+        return None
+    return (tuple(sorted(versions.items())), years)
+
+
+def is_cached(versions, years=None):
+    """True if correlations for these dataset versions and window are already computed."""
+    key = _cache_key(versions, years)
+    with _lock:
+        return key is not None and key in _results
+
+
+def get_correlations(index, versions=None, years=None):
+    """
+    Return build_correlations() for ``index``, cached per dataset version and window.
+
+    Args:
+        index: AnalyticsIndex for the current dataset versions
+        versions: Dataset versions from data_fetcher (no caching when missing)
+        years: Optional trailing year window
+
+    Returns:
+        Dictionary as returned by build_correlations
+    """
+    key = _cache_key(versions, years)
+    if key is None:
+        return build_correlations(index, years)
+    with _lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    result = build_correlations(index, years)
+    with _lock:
+        _results[key] = result
+        while len(_results) > CORRELATION_CACHE_MAX_ENTRIES:
+            _results.popitem(last=False)
+    return result
+
+
+def _select_years(inputs, wanted_states, wanted_crops):
+    """Per-year correlations across the wanted states, over the wanted crops' production."""
+    states = inputs["states"]
+    rows = [i for i, state in enumerate(states) if not wanted_states or str(state).lower() in wanted_states]
+    if wanted_crops and inputs["crops"]:
+        # Production of only the wanted crops, totalled per state
+        crop_rows = [
+            i for i, (state, crop) in enumerate(inputs["crops"])
+            if (not wanted_states or str(state).lower() in wanted_states) and str(crop).lower() in wanted_crops
+        ]
+        production = np.full((len(states), len(inputs["years"])), np.nan)
+        if crop_rows:
+            totals = pd.DataFrame(inputs["crop_production"][crop_rows]).groupby(
+                [inputs["crops"][i][0] for i in crop_rows]
+            ).sum(min_count=1)
+            row_of_state = {state: i for i, state in enumerate(states)}
+            production[[row_of_state[state] for state in totals.index]] = totals.to_numpy()
+        production = production[rows]
+    else:
+        production = inputs["production"][rows]
+    return _year_records(inputs["years"], inputs["rain"][rows], production)
+
+
+def select(correlations, states=None, crops=None):
+    """
+    Restrict cached correlation tables to the states and crops of a question.
+
+    Returns:
+        Dictionary with the same public keys: by_state/by_crop filtered
+        case-insensitively, and by_year recomputed across only the
+        selected states and crops
+    """
+    wanted_states = {s.lower() for s in states or []}
+    wanted_crops = {c.lower() for c in crops or []}
+
+    def keep(record):
+        if wanted_states and record["State"].lower() not in wanted_states:
+            return False
+        if wanted_crops and "Crop" in record and record["Crop"].lower() not in wanted_crops:
+            return False
+        return True
+
+    selected = {k: v for k, v in correlations.items() if k != "_year_inputs"}
+    selected["by_state"] = [r for r in correlations["by_state"] if keep(r)]
+    selected["by_crop"] = [r for r in correlations["by_crop"] if keep(r)]
+    inputs = correlations.get("_year_inputs")
+    if inputs is not None and (wanted_states or wanted_crops):
+        selected["by_year"] = _select_years(inputs, wanted_states, wanted_crops)
+    return selected
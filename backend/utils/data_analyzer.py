@@ -1,4 +1,5 @@
 import pandas as pd
+from . import analytics_index, correlation_engine, metrics, query_parser, trend_engine
 
 def calculate_correlation(df_rain, df_crop):
     """
@@ -14,11 +15,25 @@ def calculate_correlation(df_rain, df_crop):
     try:
         # Merge rainfall and crop data by state
         merged = pd.merge(
-            df_rain.groupby("State")["Rainfall"].mean().reset_index(),
-            df_crop.groupby("State")["Production"].sum().reset_index(),
+            df_rain.groupby("State", observed=True)["Rainfall"].mean().reset_index(),
+            df_crop.groupby("State", observed=True)["Production"].sum().reset_index(),
             on="State"
         )
+        return correlate_state_totals(merged)
+    except Exception as e:
+        return {"correlation": None, "error": str(e)}
+
+def correlate_state_totals(merged):
+    """
+    Correlate per-state average rainfall with per-state total production.
 
+    Args:
+        merged: DataFrame with one row per state and 'Rainfall' and 'Production' columns
+
+    Returns:
+        Dictionary with correlation analysis
+    """
+    try:
         if len(merged) < 2:
             return {"correlation": None, "interpretation": "Insufficient data for correlation"}
 
@@ -49,56 +64,55 @@ def perform_analysis(datasets, entities):
     Analyze rainfall and crop production data with advanced analytics.
 
     Args:
-        datasets: Dictionary containing 'rainfall' and 'crop' data
+        datasets: Dictionary from data_fetcher.fetch_data (or with 'rainfall' and 'crop' data)
         entities: Dictionary containing 'states', 'crops', 'years', 'analysis_type'
 
     Returns:
         Dictionary with comprehensive analysis results
     """
     try:
-        df_rain = pd.DataFrame(datasets["rainfall"])
-        df_crop = pd.DataFrame(datasets["crop"])
-
-        # Normalize column names (handle both uppercase and lowercase)
-        df_rain.columns = [col.capitalize() for col in df_rain.columns]
-        df_crop.columns = [col.capitalize() for col in df_crop.columns]
-
-        # Validate required columns exist
-        if "State" not in df_rain.columns or "Rainfall" not in df_rain.columns:
-            raise ValueError("Rainfall data must contain 'State' and 'Rainfall' columns")
-        if "State" not in df_crop.columns or "Production" not in df_crop.columns:
-            raise ValueError("Crop data must contain 'State' and 'Production' columns")
-
-        # Filter by states if provided in entities
-        if entities.get("states"):
-            df_rain = df_rain[df_rain["State"].isin(entities["states"])]
-            df_crop = df_crop[df_crop["State"].isin(entities["states"])]
+        # Aggregates are built once per dataset version; everything below is a lookup
+        with metrics.span("analysis.index"):
+            index = analytics_index.get_index(datasets, entities)
+        states = entities.get("states")
+        years = query_parser.year_window(entities)
+        crop_filters = {"State": states, "Crop": entities.get("crops")}
 
         # Perform analysis based on type
         analysis_type = entities.get("analysis_type", "general")
 
         # Rainfall analysis
-        rainfall_result = df_rain.groupby("State")["Rainfall"].agg(["mean", "min", "max"]).reset_index()
-        rainfall_result.columns = ["State", "Average_Rainfall", "Min_Rainfall", "Max_Rainfall"]
+        with metrics.span("analysis.rainfall"):
+            rain_by_state = index.rainfall.rollup(["State"], {"State": states}, years)
+            rainfall_result = rain_by_state[["State", "mean", "min", "max"]]
+            rainfall_result.columns = ["State", "Average_Rainfall", "Min_Rainfall", "Max_Rainfall"]
 
         # Crop analysis
-        if "Crop" in df_crop.columns:
-            # Top crops per state
-            crops = df_crop.groupby(["State", "Crop"])["Production"].sum().reset_index()
-            crops = crops.sort_values(["State", "Production"], ascending=[True, False])
-            crops = crops.groupby("State").head(10).reset_index(drop=True)
-        else:
-            # Total production by state
-            crops = df_crop.groupby("State")["Production"].sum().reset_index()
-            crops.columns = ["State", "Total_Production"]
+        with metrics.span("analysis.crop"):
+            production_by_state = index.production.rollup(["State"], crop_filters, years)[["State", "sum"]]
+            production_by_state.columns = ["State", "Production"]
+            if index.has_crop:
+                # Top crops per state
+                crops = index.production.rollup(["State", "Crop"], crop_filters, years)[["State", "Crop", "sum"]]
+                crops.columns = ["State", "Crop", "Production"]
+                crops = crops.sort_values(["State", "Production"], ascending=[True, False])
+                crops = crops.groupby("State").head(10).reset_index(drop=True)
+            else:
+                # Total production by state
+                crops = production_by_state.rename(columns={"Production": "Total_Production"})
 
         # Correlation analysis
-        correlation_analysis = calculate_correlation(df_rain, df_crop)
+        with metrics.span("analysis.correlation"):
+            correlation_analysis = correlate_state_totals(pd.merge(
+                rain_by_state[["State", "mean"]].rename(columns={"mean": "Rainfall"}),
+                production_by_state,
+                on="State"
+            ))
 
         # State-wise comparison
         state_comparison = pd.merge(
             rainfall_result,
-            df_crop.groupby("State")["Production"].sum().reset_index(),
+            production_by_state,
             on="State",
             how="left"
         )
@@ -111,6 +125,18 @@ def perform_analysis(datasets, entities):
             "analysis_type": analysis_type
         }
 
+        # Trend questions get per-series growth, rolling means, CAGR and slope
+        if analysis_type == "trend":
+            with metrics.span("analysis.trend"):
+                result["trend_analysis"] = trend_engine.analyze_trends(index, entities)
+
+        # Correlation questions get per-state, per-crop and per-year matrices
+        # (Pearson, Spearman, lagged, bootstrap CIs), computed once per data version
+        if analysis_type == "correlation":
+            with metrics.span("analysis.correlation_matrix"):
+                correlations = correlation_engine.get_correlations(index, datasets.get("versions"), years)
+                result["correlation_matrix"] = correlation_engine.select(correlations, states, entities.get("crops"))
+
         return result
     except KeyError as e:
         raise KeyError(f"Missing required key in datasets: {e}")
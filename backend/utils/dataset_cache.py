@@ -0,0 +1,320 @@
+import os
+import sys
+import asyncio
+import time
+import logging
+import threading
+import contextvars
+import concurrent.futures
+from collections import OrderedDict
+
+from . import deadline
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration (seconds / entries / approximate bytes)
+DATASET_CACHE_TTL = float(os.getenv("DATASET_CACHE_TTL", "900"))
+DATASET_CACHE_STALE_TTL = float(os.getenv("DATASET_CACHE_STALE_TTL", "3600"))
+DATASET_CACHE_MAX_ENTRIES = int(os.getenv("DATASET_CACHE_MAX_ENTRIES", "32"))
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Per-load flags of the load running in the current task (see mark_last_known_good)
+_load_flags = contextvars.ContextVar("dataset_load_flags", default=None)
+
+
+def estimate_size(value):
+    """
+    Roughly estimate the in-memory size of a cached dataset.
+
+    Args:
+        value: Cached value (a ColumnarDataset or a list of record dicts)
+
+    Returns:
+        Approximate size in bytes
+    """
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, list):
+        if not value:
+            return sys.getsizeof(value)
+        # Sample a few rows instead of walking every record
+        sample = value[:20]
+        per_row = sum(
+            sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) if isinstance(r, dict) else sys.getsizeof(r)
+            for r in sample
+        ) / len(sample)
+        return int(sys.getsizeof(value) + per_row * len(value))
+    return sys.getsizeof(value)
+
+
+class CacheEntry:
+    """A cached dataset together with its bookkeeping."""
+
+    __slots__ = ("value", "loaded_at", "size", "version", "refreshing", "last_known_good")
+
+    def __init__(self, value, version, age=0.0, last_known_good=False):
+        self.value = value
+        self.loaded_at = time.monotonic() - age
+        self.size = estimate_size(value)
+        self.version = version
+        self.refreshing = False
+        # True while the value is served in place of a failed upstream load
+        self.last_known_good = last_known_good
+
+    def age(self):
+        return time.monotonic() - self.loaded_at
+
+
+class DatasetCache:
+    """
+    Process-wide TTL cache for upstream datasets keyed by resource ID.
+
+    Fresh entries are served directly. Entries older than ``ttl`` but younger
+    than ``stale_ttl`` are served immediately while they are reloaded in the
+    background on the running event loop (stale-while-revalidate). Least
+    recently used entries are evicted once ``max_entries`` or ``max_bytes``
+    is exceeded.
+
+    Misses are single-flight: concurrent callers for the same key (on any
+    event loop, including the ones behind http_client.run_sync) share one
+    in-flight load instead of each fetching from upstream.
+
+    Entries past ``stale_ttl`` are kept as a last known good copy: it is
+    returned when a reload fails or comes back empty, and to async callers
+    whose request deadline expires while the reload is still running. Such
+    entries, and values a loader itself marked with mark_last_known_good(),
+    are flagged until a successful load replaces them (see
+    is_last_known_good), so callers can tell an upstream outage from
+    ordinary stale-while-revalidate.
+    """
+
+    def __init__(self, ttl=DATASET_CACHE_TTL, stale_ttl=DATASET_CACHE_STALE_TTL,
+                 max_entries=DATASET_CACHE_MAX_ENTRIES, max_bytes=DATASET_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._version = 0
+        self._inflight = {}
+        self._load_tasks = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+
+    def _lookup(self, key):
+        """Return ``(entry, stale)`` for a servable entry, or ``(None, False)`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = entry.age()
+                if age < self.stale_ttl:
+                    stale = age >= self.ttl
+                    if stale:
+                        self.stale_hits += 1
+                    else:
+                        self.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry, stale
+            self.misses += 1
+            return None, False
+
+    async def get_async(self, key, loader):
+        """
+        Return the cached value for ``key``, loading it with ``await loader()`` on a miss.
+
+        Empty results are returned but never cached so a transient upstream
+        failure does not pin an empty dataset for the whole TTL. Stale entries
+        are refreshed by a task on the running event loop. The wait for a load
+        is bounded by the current request deadline, after which the last known
+        good copy is returned.
+
+        Raises:
+            DeadlineExceeded if the deadline expires with nothing to serve
+        """
+        entry, stale = self._lookup(key)
+        if entry is not None:
+            if stale and not entry.refreshing:
+                entry.refreshing = True
+                self._track(asyncio.get_running_loop().create_task(self._refresh_async(key, entry, loader)))
+            return entry.value
+
+        future, leader = self._join_or_lead(key)
+        if leader:
+            # The load runs as its own task so a cancelled caller does not abort it for the others
+            self._track(asyncio.get_running_loop().create_task(self._load_async(key, loader, future)))
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), deadline.remaining())
+        except asyncio.TimeoutError:
+            # The load keeps running and will populate the cache for later requests
+            fallback = self._last_known_good(key, "deadline exceeded")
+            if fallback is None:
+                raise deadline.DeadlineExceeded(f"Latency budget exhausted waiting for {key}")
+            return fallback
+
+    def _track(self, task):
+        # The event loop only keeps weak references to tasks; hold them until done
+        self._load_tasks.add(task)
+        task.add_done_callback(self._load_tasks.discard)
+
+    def _join_or_lead(self, key):
+        """
+        Join the in-flight load for ``key``, or register a new one.
+
+        Returns:
+            Tuple of (future, leader); the leader must load the value and
+            settle the future
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = concurrent.futures.Future()
+            self.loads += 1
+            return future, True
+
+    def _settle(self, key, future, value=None, error=None):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def _last_known_good(self, key, reason):
+        """Return the expired entry for ``key`` in place of a failed load, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.last_known_good = True
+            self.fallbacks += 1
+        logger.warning(f"Serving last known good {key} ({entry.age():.0f}s old): {reason}")
+        return entry.value
+
+    async def _load_async(self, key, loader, future):
+        # Runs as its own task, so these flags are private to this load
+        flags = {"last_known_good": False}
+        _load_flags.set(flags)
+        try:
+            value = await loader()
+        except BaseException as e:
+            fallback = self._last_known_good(key, e) if isinstance(e, Exception) else None
+            if fallback is None:
+                self._settle(key, future, error=e)
+                if not isinstance(e, Exception):
+                    raise
+            else:
+                self._settle(key, future, fallback)
+            return
+        if value:
+            self.put(key, value, last_known_good=flags["last_known_good"])
+        else:
+            value = self._last_known_good(key, "empty result") or value
+        self._settle(key, future, value)
+
+    async def _refresh_async(self, key, entry, loader):
+        flags = {"last_known_good": False}
+        _load_flags.set(flags)
+        try:
+            value = await loader()
+            if value:
+                self.put(key, value, last_known_good=flags["last_known_good"])
+                self.refreshes += 1
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {e}")
+        finally:
+            entry.refreshing = False
+
+    def put(self, key, value, age=0.0, last_known_good=False):
+        """
+        Store ``value`` under ``key`` and enforce the memory bounds.
+
+        ``age`` backdates the entry, e.g. for datasets restored from a snapshot.
+        ``last_known_good`` marks a value served in place of a failed upstream
+        load; such a value is stored as already stale, so the next request
+        serves it and asks the upstream again instead of waiting out the TTL.
+        """
+        if not value:
+            return
+        if last_known_good:
+            age = max(age, self.ttl)
+        with self._lock:
+            self._version += 1
+            self._entries[key] = CacheEntry(value, self._version, age, last_known_good)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def peek(self, key):
+        """Return the cache entry for ``key`` without touching counters or recency."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def is_last_known_good(self, key):
+        """True if ``key`` is currently served in place of a failed upstream load."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.last_known_good
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _evict(self):
+        total = sum(e.size for e in self._entries.values())
+        while self._entries and (len(self._entries) > self.max_entries or total > self.max_bytes):
+            if len(self._entries) == 1:
+                # Never evict the only entry; a single oversized dataset is still worth keeping
+                break
+            evicted_key, evicted = self._entries.popitem(last=False)
+            total -= evicted.size
+            self.evictions += 1
+            logger.info(f"Evicted cached dataset {evicted_key} ({evicted.size} bytes)")
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e.size for e in self._entries.values()),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "loads": self.loads,
+                "coalesced": self.coalesced,
+                "last_known_good": self.fallbacks,
+                "inflight": len(self._inflight),
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Shared process-wide instance used by data_fetcher
+dataset_cache = DatasetCache()
+
+
+def mark_last_known_good():
+    """
+    Flag the value the running loader returns as a last known good copy.
+
+    Loaders call this when they fall back to an older copy of their own (e.g.
+    an on-disk snapshot) because the upstream failed; outside a cache load
+    it does nothing.
+    """
+    flags = _load_flags.get()
+    if flags is not None:
+        flags["last_known_good"] = True
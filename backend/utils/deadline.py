@@ -0,0 +1,70 @@
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+
+import httpx
+
+# Seconds a query may spend fetching data before it is answered from whatever is cached
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "8"))
+
+# Seconds a shared upstream load (all pages, retries included) may run
+UPSTREAM_LOAD_DEADLINE = float(os.getenv("UPSTREAM_LOAD_DEADLINE", "30"))
+
+# Absolute time.monotonic() deadline of the current request or load
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """
+    The latency budget ran out before an upstream call could be made.
+
+    A timeout subclass so existing upstream error handling (fallback and
+    metrics) treats it like any other timed out request.
+    """
+
+    def __init__(self, message="Latency budget exhausted"):
+        super().__init__(message)
+
+
+@contextmanager
+def scope(seconds, detach=False):
+    """
+    Bound everything in the enclosed block (and tasks it starts) by ``seconds``.
+
+    Nested scopes can only shorten the enclosing deadline unless ``detach``
+    is set, which starts a fresh budget, e.g. for shared loads that outlive
+    the request that triggered them.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and not detach:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or None when no deadline is set."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def clamp(timeout):
+    """
+    Shorten ``timeout`` to the remaining budget.
+
+    Raises:
+        DeadlineExceeded if the budget is already spent
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(timeout, left)
@@ -0,0 +1,258 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics
+from . import deadline
+from . import circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+# Connection pool configuration
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "16"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "8"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+
+# One pooled client (and one set of per-host limits) per event loop, since
+# httpx connections cannot be shared across loops.
+_clients = weakref.WeakKeyDictionary()
+_host_slots = weakref.WeakKeyDictionary()
+
+_sync_loop = None
+_sync_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the pooled AsyncClient bound to the running event loop.
+
+    Returns:
+        httpx.AsyncClient shared by every coroutine on this loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(10.0, connect=HTTP_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+        _clients[loop] = client
+    return client
+
+
+@asynccontextmanager
+async def host_slot(url):
+    """Limit the number of concurrent requests to a single upstream host."""
+    loop = asyncio.get_running_loop()
+    slots = _host_slots.setdefault(loop, {})
+    host = urlsplit(url).netloc
+    semaphore = slots.get(host)
+    if semaphore is None:
+        semaphore = slots[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+    async with semaphore:
+        yield
+
+
+def _is_failure(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+def _admit(url, timeout):
+    """
+    Check the endpoint's circuit breaker and the request deadline before sending.
+
+    Returns:
+        Tuple of (breaker, timeout, clamped) where ``timeout`` is shortened to
+        the remaining budget and ``clamped`` says whether that happened
+
+    Raises:
+        CircuitOpenError or DeadlineExceeded if the request must not be sent
+    """
+    host = urlsplit(url).netloc
+    breaker = circuit_breaker.get_breaker(url)
+    if not breaker.allow():
+        metrics.record_skipped(host, "circuit_open")
+        raise circuit_breaker.CircuitOpenError(f"Circuit open for {breaker.endpoint}")
+    try:
+        effective = deadline.clamp(timeout)
+    except deadline.DeadlineExceeded:
+        metrics.record_skipped(host, "deadline")
+        raise
+    return breaker, effective, effective < timeout
+
+
+def _record_outcome(breaker, error, clamped, url, params, headers):
+    """Feed a request outcome to its breaker; timeouts caused by a shortened budget are not the upstream's fault."""
+    if error is None:
+        breaker.record_success()
+    elif not (error == "timeout" and clamped):
+        breaker.record_failure(lambda: probe(url, params, headers))
+
+
+async def probe(url, params=None, headers=None):
+    """
+    Check whether an endpoint answers again, reading only the response status.
+
+    Bypasses the circuit breaker and per-host limits; used by open breakers.
+
+    Returns:
+        True if the endpoint answered without a server error or throttling
+    """
+    client = get_client()
+    async with client.stream(
+        "GET",
+        url,
+        params=params,
+        headers=headers,
+        timeout=httpx.Timeout(10.0, connect=HTTP_CONNECT_TIMEOUT),
+    ) as response:
+        return not _is_failure(response.status_code)
+
+
+async def get(url, params=None, timeout=10, headers=None):
+    """
+    Issue a pooled GET request, respecting the per-host connection limit.
+
+    The timeout is shortened to the remaining request deadline, and requests
+    to an endpoint whose circuit breaker is open fail fast.
+
+    Args:
+        url: Request URL
+        params: Optional query parameters
+        timeout: Read timeout in seconds
+        headers: Optional request headers
+
+    Returns:
+        httpx.Response
+
+    Raises:
+        CircuitOpenError or DeadlineExceeded (both httpx.HTTPError) without
+        contacting the upstream
+    """
+    client = get_client()
+    host = urlsplit(url).netloc
+    async with host_slot(url):
+        # Checked after queueing for a slot, which may have used up part of the budget
+        breaker, timeout, clamped = _admit(url, timeout)
+        start = time.perf_counter()
+        try:
+            response = await client.get(
+                url,
+                params=params,
+                headers=headers,
+                timeout=httpx.Timeout(timeout, connect=min(HTTP_CONNECT_TIMEOUT, timeout)),
+            )
+        except httpx.TimeoutException:
+            metrics.record_upstream(host, time.perf_counter() - start, error="timeout")
+            _record_outcome(breaker, "timeout", clamped, url, params, headers)
+            raise
+        except httpx.HTTPError:
+            metrics.record_upstream(host, time.perf_counter() - start, error="transport")
+            _record_outcome(breaker, "transport", clamped, url, params, headers)
+            raise
+        elapsed = time.perf_counter() - start
+        error = "status" if _is_failure(response.status_code) else None
+        metrics.record_upstream(host, elapsed, len(response.content), error)
+        metrics.observe("upstream", elapsed)
+        _record_outcome(breaker, error, clamped, url, params, headers)
+        return response
+
+
+@asynccontextmanager
+async def stream(url, params=None, timeout=10, headers=None):
+    """
+    Issue a pooled, streamed GET request, respecting the per-host connection limit.
+
+    The body is not read up front; iterate ``response.aiter_bytes()`` inside
+    the ``async with`` block to consume it incrementally. Deadline and
+    circuit breaker handling are the same as for get().
+
+    Args:
+        url: Request URL
+        params: Optional query parameters
+        timeout: Read timeout in seconds
+        headers: Optional request headers
+
+    Yields:
+        httpx.Response with an unread body
+    """
+    client = get_client()
+    host = urlsplit(url).netloc
+    async with host_slot(url):
+        breaker, timeout, clamped = _admit(url, timeout)
+        start = time.perf_counter()
+        error = None
+        response = None
+        try:
+            async with client.stream(
+                "GET",
+                url,
+                params=params,
+                headers=headers,
+                timeout=httpx.Timeout(timeout, connect=min(HTTP_CONNECT_TIMEOUT, timeout)),
+            ) as response:
+                if _is_failure(response.status_code):
+                    error = "status"
+                yield response
+        except httpx.TimeoutException:
+            error = "timeout"
+            raise
+        except httpx.HTTPStatusError as e:
+            # Raised by the caller's raise_for_status(); as in get(), only 5xx/429 count against the upstream
+            error = "status" if _is_failure(e.response.status_code) else None
+            raise
+        except httpx.HTTPError:
+            error = "transport"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            nbytes = response.num_bytes_downloaded if response is not None else 0
+            metrics.record_upstream(host, elapsed, nbytes, error)
+            metrics.observe("upstream", elapsed)
+            _record_outcome(breaker, error, clamped, url, params, headers)
+
+
+async def close():
+    """Close the client bound to the running loop (called on app shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _get_sync_loop():
+    global _sync_loop
+    with _sync_lock:
+        if _sync_loop is None or _sync_loop.is_closed():
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="http-sync-loop", daemon=True).start()
+        return _sync_loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+
+    Coroutines are executed on a dedicated background loop so sync callers
+    share one connection pool and never clash with an already running loop.
+    """
+    loop = _get_sync_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the background fetch loop")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
@@ -0,0 +1,180 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Set to 0 to turn every span and counter into a no-op
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Spans recorded for the current request, used for the Server-Timing header
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with one series per label value."""
+
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_value, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per tuple of label values."""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+stage_duration = Histogram(
+    "govdata_stage_duration_seconds", "Time spent in each query pipeline stage", "stage")
+upstream_duration = Histogram(
+    "govdata_upstream_request_duration_seconds", "Upstream HTTP request latency", "host")
+upstream_bytes = Counter(
+    "govdata_upstream_bytes_total", "Response bytes received from upstream", ("host",))
+upstream_rows = Counter(
+    "govdata_upstream_rows_total", "Records parsed from upstream responses", ("source",))
+upstream_errors = Counter(
+    "govdata_upstream_errors_total",
+    "Failed or skipped upstream requests by kind (timeout, status, transport, circuit_open, deadline)", ("host", "kind"))
+
+
+def observe(stage, seconds):
+    """Record ``seconds`` for ``stage`` in the histogram and the current request's timings."""
+    if not METRICS_ENABLED:
+        return
+    stage_duration.observe(stage, seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as pipeline stage ``stage``."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def record_upstream(host, seconds, nbytes=0, error=None):
+    """Record one upstream request; ``error`` is None, 'timeout', 'status' or 'transport'."""
+    if not METRICS_ENABLED:
+        return
+    upstream_duration.observe(host, seconds)
+    if nbytes:
+        upstream_bytes.inc((host,), nbytes)
+    if error:
+        upstream_errors.inc((host, error))
+
+
+def record_skipped(host, reason):
+    """Count a request that was never sent; ``reason`` is 'circuit_open' or 'deadline'."""
+    if METRICS_ENABLED:
+        upstream_errors.inc((host, reason))
+
+
+def record_rows(source, count):
+    """Count records parsed from an upstream source ('ckan' or 'export')."""
+    if METRICS_ENABLED and count:
+        upstream_rows.inc((source,), count)
+
+
+def start_request():
+    """Begin collecting spans for the current request; returns the span list."""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans):
+    """
+    Format collected spans as a Server-Timing header value.
+
+    Repeated stages (e.g. several upstream pages) are summed.
+    """
+    totals = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage.replace('.', '-')};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+def _gauge_lines(prefix, stats):
+    lines = []
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def render(cache_stats=None):
+    """
+    Render every metric in Prometheus text exposition format.
+
+    Args:
+        cache_stats: Optional {name: stats_dict} exported as gauges
+            (e.g. dataset and response cache hit rates)
+
+    Returns:
+        Exposition text
+    """
+    lines = []
+    for metric in (stage_duration, upstream_duration, upstream_bytes, upstream_rows, upstream_errors):
+        lines.extend(metric.render())
+    for name, stats in (cache_stats or {}).items():
+        lines.extend(_gauge_lines(f"govdata_{name}", stats))
+    return "\n".join(lines) + "\n"
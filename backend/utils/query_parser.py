@@ -1,4 +1,162 @@
+import os
 import re
+import json
+import threading
+
+# Default vocabulary shipped next to this module; override with GAZETTEER_PATH
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "gazetteer.json")
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+
+# Words and numbers; punctuation and extra whitespace never affect matching
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+")
+
+# Marks the end of a term in the trie
+_TERMINAL = ""
+# Holds the context words an ambiguous term needs (never a token)
+_CONTEXT = "?"
+
+
+class EntityMatcher:
+    """
+    Token trie over every gazetteer term.
+
+    Each query is tokenised once and scanned left to right, taking the longest
+    term that starts at each token. The work per query depends on its length
+    and the longest term (in tokens), not on how many terms the gazetteer has.
+
+    Terms that are also ordinary words or names ("gram", "Krishna") are
+    listed under 'ambiguous_terms' with the context words that must appear
+    somewhere in the question for them to match.
+    """
+
+    def __init__(self, gazetteer):
+        self.trie = {}
+        self.analysis_priority = list(gazetteer.get("analysis_keywords", {}))
+
+        for canonical, aliases in gazetteer.get("states", {}).items():
+            for alias in [canonical] + list(aliases):
+                self._add(alias, ("state", canonical))
+        for district, state in gazetteer.get("districts", {}).items():
+            self._add(district, ("district", district, state))
+        for canonical, aliases in gazetteer.get("crops", {}).items():
+            for alias in [canonical] + list(aliases):
+                self._add(alias, ("crop", canonical))
+        for analysis_type, words in gazetteer.get("analysis_keywords", {}).items():
+            for word in words:
+                self._add(word, ("analysis", analysis_type))
+        for term, context in gazetteer.get("ambiguous_terms", {}).items():
+            node = self._node(term)
+            if node is not None:
+                node[_CONTEXT] = frozenset(w.lower() for w in context)
+
+    def _node(self, term):
+        """Trie node of ``term``, or None if no gazetteer term has those tokens."""
+        node = self.trie
+        for token in TOKEN_PATTERN.findall(term.lower()):
+            node = node.get(token)
+            if node is None:
+                return None
+        return node if _TERMINAL in node else None
+
+    def _add(self, term, entry):
+        tokens = TOKEN_PATTERN.findall(term.lower())
+        if not tokens:
+            return
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        entries = node.setdefault(_TERMINAL, [])
+        if entry not in entries:
+            entries.append(entry)
+
+    def extract(self, query):
+        """Extract entities from one query in a single left-to-right pass."""
+        tokens = TOKEN_PATTERN.findall(query.lower())
+        words = set(tokens)
+        states, crops, districts = [], [], []
+        analysis_hits = set()
+        years = None
+
+        i = 0
+        n = len(tokens)
+        while i < n:
+            # Longest gazetteer term starting at token i
+            node = self.trie
+            matched, end = None, i
+            j = i
+            while j < n and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if _TERMINAL in node and not (_CONTEXT in node and node[_CONTEXT].isdisjoint(words)):
+                    matched, end = node[_TERMINAL], j
+            if matched:
+                for entry in matched:
+                    kind = entry[0]
+                    if kind == "state" and entry[1] not in states:
+                        states.append(entry[1])
+                    elif kind == "crop" and entry[1] not in crops:
+                        crops.append(entry[1])
+                    elif kind == "district":
+                        if entry[1] not in districts:
+                            districts.append(entry[1])
+                        if entry[2] not in states:
+                            states.append(entry[2])
+                    elif kind == "analysis":
+                        analysis_hits.add(entry[1])
+                i = end
+                continue
+
+            # "<N> year(s)" sets the analysis window (first occurrence wins)
+            token = tokens[i]
+            if years is None and token.isdigit() and i + 1 < n and tokens[i + 1].startswith("year"):
+                years = int(token)
+            i += 1
+
+        analysis_type = next((t for t in self.analysis_priority if t in analysis_hits), "general")
+        return {
+            "states": states,
+            "crops": crops,
+            "districts": districts,
+            "years": years if years is not None else 5,
+            # Only a window the question states ("last 3 years") restricts the data
+            "years_explicit": years is not None,
+            "analysis_type": analysis_type
+        }
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def load_gazetteer(path=None):
+    """
+    Load a gazetteer and make it the active vocabulary.
+
+    Args:
+        path: JSON file with 'states', 'districts', 'crops' and
+            'analysis_keywords' sections, and optionally 'ambiguous_terms'
+            (defaults to GAZETTEER_PATH)
+
+    Returns:
+        The compiled EntityMatcher
+    """
+    global _matcher
+    with open(path or GAZETTEER_PATH, encoding="utf-8") as f:
+        matcher = EntityMatcher(json.load(f))
+    with _matcher_lock:
+        _matcher = matcher
+    return matcher
+
+
+def _get_matcher():
+    matcher = _matcher
+    if matcher is None:
+        with _matcher_lock:
+            matcher = _matcher
+        if matcher is None:
+            matcher = load_gazetteer()
+    return matcher
+
 
 def extract_entities(query: str):
     """
@@ -8,62 +166,31 @@ def extract_entities(query: str):
         query: Natural language query string
 
     Returns:
-        Dictionary with extracted states, crops, years, and analysis type
+        Dictionary with extracted states, crops, districts, years (with
+        years_explicit), and analysis type
+    """
+    return _get_matcher().extract(query)
+
+
+def year_window(entities):
+    """
+    Trailing year window to filter on, or None to use every year.
+
+    The default ``years`` value is only a label; data is restricted only when
+    the question asked for a window.
+    """
+    return entities.get("years") if entities.get("years_explicit") else None
+
+
+def extract_entities_batch(queries):
+    """
+    Extract entities for many queries with the same compiled matcher.
+
+    Args:
+        queries: Iterable of query strings
+
+    Returns:
+        List of entity dictionaries, in input order
     """
-    # Convert query to lowercase for case-insensitive matching
-    query_lower = query.lower()
-
-    # Define state and crop patterns
-    state_pattern = r"(maharashtra|punjab|karnataka|kerala|tamil\s+nadu|gujarat|andhra\s+pradesh|telangana|uttar\s+pradesh|madhya\s+pradesh|rajasthan|haryana|west\s+bengal|bihar|odisha|assam)"
-    crop_pattern = r"(rice|wheat|cotton|sugarcane|maize|soybean|pulses|groundnut|sunflower|barley|jowar|bajra|linseed|mustard|coconut|tea|coffee|spices)"
-    years_pattern = r"(\d+)\s*year"
-
-    # Extract entities (case-insensitive for states and crops)
-    states_raw = re.findall(state_pattern, query_lower)
-    crops_raw = re.findall(crop_pattern, query_lower)
-    years = re.findall(years_pattern, query_lower)
-
-    # Normalize state names (capitalize properly)
-    state_mapping = {
-        "maharashtra": "Maharashtra",
-        "punjab": "Punjab",
-        "karnataka": "Karnataka",
-        "kerala": "Kerala",
-        "tamil nadu": "Tamil Nadu",
-        "gujarat": "Gujarat",
-        "andhra pradesh": "Andhra Pradesh",
-        "telangana": "Telangana",
-        "uttar pradesh": "Uttar Pradesh",
-        "madhya pradesh": "Madhya Pradesh",
-        "rajasthan": "Rajasthan",
-        "haryana": "Haryana",
-        "west bengal": "West Bengal",
-        "bihar": "Bihar",
-        "odisha": "Odisha",
-        "assam": "Assam"
-    }
-
-    states = [state_mapping[s] for s in states_raw if s in state_mapping]
-
-    # Normalize crop names (capitalize)
-    crops = [c.capitalize() for c in crops_raw]
-
-    # Determine analysis type based on query keywords
-    analysis_type = "general"
-    if any(word in query_lower for word in ["correlation", "relationship", "impact", "effect", "influence"]):
-        analysis_type = "correlation"
-    elif any(word in query_lower for word in ["trend", "growth", "decline", "change"]):
-        analysis_type = "trend"
-    elif any(word in query_lower for word in ["top", "highest", "best", "maximum", "rank"]):
-        analysis_type = "ranking"
-    elif any(word in query_lower for word in ["compare", "comparison", "vs", "versus"]):
-        analysis_type = "comparison"
-    elif any(word in query_lower for word in ["rainfall", "rain", "precipitation", "weather", "climate"]):
-        analysis_type = "climate"
-
-    return {
-        "states": states,
-        "crops": crops,
-        "years": int(years[0]) if years else 5,
-        "analysis_type": analysis_type
-    }
+    matcher = _get_matcher()
+    return [matcher.extract(q) for q in queries]
@@ -0,0 +1,101 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .batch_planner import entity_key
+
+# Maximum number of distinct entity sets whose rendered analysis is kept
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+
+class CachedResponse:
+    """Analysis and summary template for one entity set at one dataset version."""
+
+    __slots__ = ("analysis", "summary")
+
+    def __init__(self, analysis, summary):
+        self.analysis = analysis
+        self.summary = summary
+
+
+class ResponseCache:
+    """
+    LRU cache of /query results keyed by canonical entities and dataset versions.
+
+    Questions phrased differently but resolving to the same states, crops,
+    window and analysis type share one entry per dataset version, so
+    refreshed data is never answered from an old analysis. Entries for
+    versions no longer served simply age out of the LRU; several versions of
+    one entity set (e.g. a pushdown-filtered subset and the full resource
+    used by batches) can be cached side by side.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _versions_key(versions):
+        if not versions or not all(versions.values()):
+            return None
+        return tuple(sorted(versions.items()))
+
+    def get(self, entities, versions):
+        """
+        Return the CachedResponse for ``entities`` at ``versions``, or None.
+
+        Args:
+            entities: Dictionary from query_parser.extract_entities
+            versions: Dataset versions from data_fetcher.fetch_data_async
+        """
+        versions_key = self._versions_key(versions)
+        key = (entity_key(entities), versions_key)
+        with self._lock:
+            entry = self._entries.get(key) if versions_key is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, entities, versions, analysis, summary):
+        """
+        Store a computed response; responses over unversioned data are not cached.
+
+        Args:
+            entities: Dictionary from query_parser.extract_entities
+            versions: Dataset versions the analysis was computed from
+            analysis: Result of data_analyzer.perform_analysis
+            summary: Result of summarizer.summary_template
+        """
+        versions_key = self._versions_key(versions)
+        if versions_key is None:
+            return
+        key = (entity_key(entities), versions_key)
+        with self._lock:
+            self._entries[key] = CachedResponse(analysis, summary)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Shared by every request handled by this worker
+response_cache = ResponseCache()
@@ -0,0 +1,145 @@
+import os
+import gzip
+import json
+import math
+
+import numpy as np
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Responses are still gzip-compressed without it
+    brotli = None
+
+# Response bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Payload shapes accepted in the "format" field of query requests
+RESPONSE_FORMATS = ("records", "columnar")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _plain(value):
+    """Convert numpy values and non-finite floats for the standard library encoder"""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _plain(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def dumps(obj):
+    """
+    Encode ``obj`` as compact UTF-8 JSON.
+
+    numpy scalars and arrays are encoded natively and NaN/Infinity become
+    null, matching what the browser's JSON.parse accepts.
+
+    Returns:
+        Encoded bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+    return json.dumps(_plain(obj), separators=(",", ":"), default=str).encode()
+
+
+def to_columns(records):
+    """
+    Convert a list of row dicts into a dict of column arrays.
+
+    Columns keep the key order of the rows; a key missing from a row is null.
+    """
+    names = {}
+    for record in records:
+        for name in record:
+            names.setdefault(name, None)
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+def columnar(value):
+    """
+    Rewrite every table (non-empty list of row dicts) in ``value`` as column arrays.
+
+    {"rainfall_analysis": [{"State": "Punjab", "Average_Rainfall": 640.2}, ...]}
+    becomes {"rainfall_analysis": {"State": ["Punjab", ...], "Average_Rainfall": [640.2, ...]}},
+    which chart components can use as labels and data series directly.
+    """
+    if isinstance(value, dict):
+        return {k: columnar(v) for k, v in value.items()}
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return to_columns(value)
+    return value
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick the content coding for an Accept-Encoding header: br, gzip or None"""
+    offered = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[coding.strip()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    """Compress ``body`` with the negotiated content coding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with dumps(), bypassing FastAPI's generic encoder"""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+def json_response(request, payload):
+    """
+    Encode a response payload, compressed if the client accepts it.
+
+    Args:
+        request: Incoming request (for Accept-Encoding)
+        payload: JSON-serialisable dictionary, with any tables already in
+            the requested shape (see columnar)
+
+    Returns:
+        Response with an encoded, possibly compressed body
+    """
+    body = dumps(payload)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
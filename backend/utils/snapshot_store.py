@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+from .columnar import ColumnarDataset
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots still work, just without cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Snapshot configuration
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "govdata-snapshots"))
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", os.getenv("DATASET_CACHE_TTL", "900")))
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1").lower() not in ("0", "false", "no")
+
+SNAPSHOT_FORMAT = 2
+
+# File inside a key's snapshot directory naming its current version directory
+_POINTER = "CURRENT"
+# File next to the pointer recording when a version was last revalidated upstream
+_VERIFIED = "VERIFIED"
+
+
+class Snapshot:
+    """A dataset loaded from disk together with its metadata."""
+
+    def __init__(self, dataset, meta):
+        self.dataset = dataset
+        self.meta = meta
+
+    @property
+    def age(self):
+        return time.time() - self.meta.get("fetched_at", 0)
+
+    def is_fresh(self, ttl=None):
+        return self.age < (SNAPSHOT_TTL if ttl is None else ttl)
+
+
+def snapshot_version(meta):
+    """Content-derived version tag, identical in every worker that loads the snapshot."""
+    return f"snapshot:{meta['content_hash'][:16]}"
+
+
+def _snapshot_path(key):
+    # Keys are resource IDs or URLs; hash them into safe directory names
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, digest)
+
+
+def _current_dir(key):
+    """Return the version directory the pointer of ``key`` names, or None."""
+    path = _snapshot_path(key)
+    try:
+        with open(os.path.join(path, _POINTER), encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(path, name) if name else None
+
+
+def _write_atomic(path, text):
+    tmp = path + f".tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _prune(path, keep):
+    """Remove version directories of a snapshot other than those in ``keep``."""
+    for name in os.listdir(path):
+        if name not in keep and os.path.isdir(os.path.join(path, name)):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def save_snapshot(key, dataset, etag=None, last_modified=None):
+    """
+    Persist a ColumnarDataset as a snapshot (one .npy file per column).
+
+    Each save writes a new, never modified version directory and then
+    atomically replaces the pointer file naming the current one, so a reader
+    always maps the column files and categories of the same version. The
+    previous version is kept for readers still loading it; older ones are
+    removed.
+
+    Args:
+        key: Resource ID or export URL
+        dataset: ColumnarDataset to persist
+        etag: Upstream ETag, if any
+        last_modified: Upstream Last-Modified header, if any
+
+    Returns:
+        Metadata dict of the written snapshot, or None if nothing was written
+    """
+    if not SNAPSHOT_ENABLED or not dataset:
+        return None
+
+    path = _snapshot_path(key)
+    previous = read_meta(key)
+    columns = {}
+    digest = hashlib.sha1()
+    for name in dataset.columns:
+        spec = {"kind": dataset.kinds[name]}
+        if name in dataset.categories:
+            spec["categories"] = dataset.categories[name]
+        columns[name] = spec
+        digest.update(json.dumps([name, spec]).encode("utf-8"))
+        digest.update(np.ascontiguousarray(dataset.arrays[name]).tobytes())
+    content_hash = digest.hexdigest()
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "key": key,
+        "version": (previous or {}).get("version", 0) + 1,
+        "content_hash": content_hash,
+        "fetched_at": time.time(),
+        "etag": etag,
+        "last_modified": last_modified,
+        "rows": len(dataset),
+        "baseline_at": dataset.baseline_at,
+        "columns": columns,
+    }
+    if previous and previous.get("content_hash") == content_hash:
+        # Unchanged content: keep the version, just record the new fetch time
+        meta["version"] = previous["version"]
+
+    try:
+        if os.path.exists(os.path.join(path, "meta.json")):
+            # Snapshot written in the previous single-directory layout
+            shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        previous_dir = _current_dir(key)
+        target = tempfile.mkdtemp(prefix=f"v{meta['version']}-", dir=path)
+        for index, name in enumerate(dataset.columns):
+            np.save(os.path.join(target, f"col{index}.npy"), dataset.arrays[name])
+        with open(os.path.join(target, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        _write_atomic(os.path.join(path, _POINTER), os.path.basename(target))
+        _prune(path, {os.path.basename(target), os.path.basename(previous_dir or "")})
+        return meta
+    except OSError as e:
+        logger.warning(f"Failed to write snapshot for {key}: {e}")
+        return None
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        return None
+    # A later revalidation of this same version counts as its fetch time
+    try:
+        with open(os.path.join(os.path.dirname(directory), _VERIFIED), encoding="utf-8") as f:
+            verified = json.load(f)
+        if verified.get("version_dir") == os.path.basename(directory):
+            meta["fetched_at"] = max(meta.get("fetched_at", 0), verified.get("fetched_at", 0))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return meta
+
+
+def read_meta(key):
+    """Return the metadata of the stored snapshot for ``key``, or None."""
+    directory = _current_dir(key)
+    return _read_meta(directory) if directory else None
+
+
+def load_snapshot(key):
+    """
+    Load the snapshot for ``key``, memory-mapping its column files.
+
+    Returns:
+        Snapshot instance, or None if no usable snapshot exists
+    """
+    if not SNAPSHOT_ENABLED:
+        return None
+    # A version directory is only removed two saves after it stopped being
+    # current; if that happened mid-load, resolve the pointer again
+    for attempt in range(3):
+        directory = _current_dir(key)
+        meta = _read_meta(directory) if directory else None
+        if meta is None:
+            if directory and _current_dir(key) != directory:
+                continue
+            return None
+        try:
+            arrays, kinds, categories = {}, {}, {}
+            for index, (name, spec) in enumerate(meta["columns"].items()):
+                arrays[name] = np.load(os.path.join(directory, f"col{index}.npy"), mmap_mode="r")
+                kinds[name] = spec["kind"]
+                if "categories" in spec:
+                    categories[name] = spec["categories"]
+        except OSError as e:
+            if _current_dir(key) != directory:
+                continue
+            logger.warning(f"Ignoring unreadable snapshot for {key}: {e}")
+            return None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable snapshot for {key}: {e}")
+            return None
+        dataset = ColumnarDataset(arrays, kinds, categories, snapshot_version(meta))
+        dataset.fetched_at = meta.get("fetched_at")
+        dataset.baseline_at = meta.get("baseline_at")
+        return Snapshot(dataset, meta)
+    return None
+
+
+def has_fresh_snapshot(key):
+    """Return True if a snapshot for ``key`` exists and is within SNAPSHOT_TTL."""
+    if not SNAPSHOT_ENABLED:
+        return False
+    meta = read_meta(key)
+    return meta is not None and time.time() - meta.get("fetched_at", 0) < SNAPSHOT_TTL
+
+
+def touch_snapshot(key):
+    """
+    Mark an unchanged snapshot as freshly validated against the upstream.
+
+    The time is recorded next to the pointer, tagged with the version
+    directory it applies to, so version directories are never modified once
+    written and a later save makes the record obsolete.
+    """
+    directory = _current_dir(key)
+    if directory is None or _read_meta(directory) is None:
+        return
+    verified = {"version_dir": os.path.basename(directory), "fetched_at": time.time()}
+    try:
+        _write_atomic(os.path.join(_snapshot_path(key), _VERIFIED), json.dumps(verified))
+    except OSError as e:
+        logger.warning(f"Failed to update snapshot metadata for {key}: {e}")
+
+
+@asynccontextmanager
+async def refresh_lock(key):
+    """
+    Hold an exclusive cross-process lock while refreshing ``key``.
+
+    Only one worker refreshes a resource at a time; the others wait and then
+    pick up the snapshot it wrote instead of hitting the upstream themselves.
+    """
+    if fcntl is None or not SNAPSHOT_ENABLED:
+        yield
+        return
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    lock_path = _snapshot_path(key) + ".lock"
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
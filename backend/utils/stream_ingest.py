@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import codecs
+
+from .columnar import ColumnarDataset
+
+# Records parsed into Python dicts before they are encoded into typed columns
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "5000"))
+
+# Start of the record array in CKAN ({"result": {"records": [...]}}) and export payloads
+_ARRAY_KEY = re.compile(r'"(?:records|data)"\s*:\s*\[')
+_TOTAL_KEY = re.compile(r'"total"\s*:\s*"?(\d+)')
+_WHITESPACE = re.compile(r"[\s,]*")
+
+
+class RecordStreamParser:
+    """
+    Incremental parser yielding the records of a JSON payload as text arrives.
+
+    Only one record (plus an unparsed tail) is held at a time. Text outside
+    the record array is kept so the upstream ``total`` can be read whether
+    it appears before or after the records.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "prefix"
+        self._outside = []
+
+    def feed(self, text):
+        """Add ``text`` and return the records completed by it."""
+        self._buffer += text
+        records = []
+        if self._state == "prefix":
+            stripped = self._buffer.lstrip()
+            if stripped.startswith("["):
+                # Export endpoints may return a bare array of records
+                self._buffer = stripped[1:]
+                self._state = "records"
+            else:
+                match = _ARRAY_KEY.search(self._buffer)
+                if match is None:
+                    return records
+                self._outside.append(self._buffer[:match.start()])
+                self._buffer = self._buffer[match.end():]
+                self._state = "records"
+
+        if self._state == "records":
+            buffer = self._buffer
+            position = 0
+            while True:
+                position = _WHITESPACE.match(buffer, position).end()
+                if position >= len(buffer):
+                    break
+                if buffer[position] == "]":
+                    self._state = "suffix"
+                    position += 1
+                    break
+                try:
+                    record, end = self._decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Record continues in the next chunk
+                    break
+                records.append(record)
+                position = end
+            self._buffer = buffer[position:]
+
+        if self._state == "suffix":
+            self._outside.append(self._buffer)
+            self._buffer = ""
+        return records
+
+    def finish(self):
+        """
+        Validate the end of the payload.
+
+        Returns:
+            The upstream total record count, or None if it was not reported
+
+        Raises:
+            ValueError if the payload ended inside the record array
+        """
+        if self._state == "records":
+            raise ValueError("Truncated JSON payload: record array not terminated")
+        match = _TOTAL_KEY.search("".join(self._outside))
+        return int(match.group(1)) if match else None
+
+
+async def ingest_response(response, rename=None, columns=None, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Stream an httpx response body into a ColumnarDataset.
+
+    The body is decoded and parsed incrementally; every ``chunk_rows``
+    records are projected, normalised and encoded into typed column chunks,
+    which are concatenated at the end. Peak memory is the typed columns plus
+    one chunk of record dicts rather than the whole payload and its records.
+
+    Args:
+        response: Streamed httpx.Response (body not yet read)
+        rename: Optional mapping of upstream field name to canonical column name
+        columns: Optional collection of upstream field names to keep
+        chunk_rows: Records per encoded chunk
+
+    Returns:
+        Tuple of (dataset, total, rows) where total is the upstream record
+        count (None if not reported) and rows the number of records parsed
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    parser = RecordStreamParser()
+    pending, chunks, rows = [], [], 0
+
+    def flush():
+        chunks.append(ColumnarDataset.from_records(pending, rename, columns=columns))
+        pending.clear()
+
+    async for data in response.aiter_bytes():
+        for record in parser.feed(decoder.decode(data)):
+            if isinstance(record, dict):
+                pending.append(record)
+                rows += 1
+                if len(pending) >= chunk_rows:
+                    flush()
+    for record in parser.feed(decoder.decode(b"", final=True)):
+        if isinstance(record, dict):
+            pending.append(record)
+            rows += 1
+    total = parser.finish()
+    if pending:
+        flush()
+    return ColumnarDataset.concat(chunks), total, rows
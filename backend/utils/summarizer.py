@@ -9,6 +9,39 @@ def generate_summary(analysis_result, query):
     Returns:
         Formatted summary string
     """
+    return render_summary(summary_template(analysis_result), query)
+
+
+def render_summary(template, query):
+    """
+    Render a summary template for one query.
+
+    Args:
+        template: Result of summary_template (list of sentences or a final message)
+        query: Original user query, echoed at the end of the summary
+
+    Returns:
+        Formatted summary string
+    """
+    if isinstance(template, str):
+        return template
+    return ". ".join(template) + f". Query: {query}"
+
+
+def summary_template(analysis_result):
+    """
+    Build the query-independent part of a summary.
+
+    The result can be cached alongside the analysis and rendered for any
+    query that resolves to the same entities.
+
+    Args:
+        analysis_result: Dictionary with analysis results
+
+    Returns:
+        List of summary sentences, or a final message string when there is
+        nothing to summarize
+    """
     try:
         rainfall_data = analysis_result.get("rainfall_analysis", [])
         crop_data = analysis_result.get("crop_analysis", [])
@@ -32,6 +65,15 @@ def generate_summary(analysis_result, query):
                 summary_parts.append(f"Correlation Analysis: {interpretation} (Correlation coefficient: {correlation_value})")
             else:
                 summary_parts.append("Correlation analysis could not be performed with available data.")
+            matrix = analysis_result.get("correlation_matrix") or {}
+            series = [r for r in (matrix.get("by_crop") or matrix.get("by_state") or []) if r.get("Pearson") is not None]
+            if series:
+                strongest = max(series, key=lambda r: abs(r["Pearson"]))
+                label = f"{strongest['Crop']} in {strongest['State']}" if strongest.get("Crop") else strongest["State"]
+                part = f"Strongest year-on-year link: {label} (r={strongest['Pearson']:+.2f}"
+                if strongest.get("CI_Low") is not None and strongest.get("CI_High") is not None:
+                    part += f", 95% CI {strongest['CI_Low']:+.2f} to {strongest['CI_High']:+.2f}"
+                summary_parts.append(part + f", {strongest['Observations']} years)")
 
         elif analysis_type == "ranking":
             if crop_data:
@@ -44,7 +86,29 @@ def generate_summary(analysis_result, query):
                 summary_parts.append(f"Average rainfall across {states_str}: {avg_rainfall:.0f}mm")
 
         elif analysis_type == "trend":
-            summary_parts.append(f"Analyzing trends for {states_str}")
+            trends = analysis_result.get("trend_analysis") or {}
+            rainfall_trends = trends.get("rainfall_trends") or []
+            production_trends = trends.get("production_trends") or []
+            if not rainfall_trends and not production_trends:
+                summary_parts.append(f"Analyzing trends for {states_str}")
+            for trend in rainfall_trends:
+                years = trend.get("Years") or []
+                period = f"{years[0]}-{years[-1]}" if years else "the selected period"
+                part = f"Rainfall in {trend.get('State')} is {trend.get('Direction')} over {period}"
+                if trend.get("Slope") is not None:
+                    part += f" ({trend['Slope']:+.1f}mm/year"
+                    part += f", CAGR {trend['CAGR']:+.1f}%)" if trend.get("CAGR") is not None else ")"
+                summary_parts.append(part)
+            ranked = [t for t in production_trends if t.get("CAGR") is not None]
+            label = lambda t: f"{t['Crop']} in {t['State']}" if t.get("Crop") else t["State"]
+            if len(ranked) == 1:
+                only = ranked[0]
+                summary_parts.append(f"Production of {label(only)} is {only['Direction']} (CAGR {only['CAGR']:+.1f}%)")
+            elif ranked:
+                fastest = max(ranked, key=lambda t: t["CAGR"])
+                slowest = min(ranked, key=lambda t: t["CAGR"])
+                summary_parts.append(f"Fastest growing production: {label(fastest)} (CAGR {fastest['CAGR']:+.1f}%)")
+                summary_parts.append(f"Weakest production trend: {label(slowest)} (CAGR {slowest['CAGR']:+.1f}%)")
 
         elif analysis_type == "comparison":
             summary_parts.append(f"Comparing agricultural metrics across {states_str}")
@@ -60,8 +124,7 @@ def generate_summary(analysis_result, query):
             if correlation.get("correlation") is not None:
                 summary_parts.append(f"Rainfall-Production Correlation: {correlation.get('interpretation', '')}")
 
-        summary = ". ".join(summary_parts) + f". Query: {query}"
-        return summary
+        return summary_parts
 
     except Exception as e:
         return f"Error generating summary: {str(e)}"
@@ -0,0 +1,169 @@
+import os
+
+import numpy as np
+
+from . import query_parser
+
+TREND_ROLLING_WINDOW = int(os.getenv("TREND_ROLLING_WINDOW", "3"))
+
+# Relative slope (per year, as a fraction of the series mean) below which a series counts as stable
+STABLE_THRESHOLD = 0.01
+
+
+def _pivot(frame, keys):
+    """
+    Pivot (keys..., Year, value) rows into a series-by-year matrix.
+
+    Returns:
+        Tuple of (labels, years, matrix) where matrix[i, j] is the value of
+        series ``labels[i]`` in ``years[j]`` (NaN where missing)
+    """
+    years = np.sort(frame["Year"].unique())
+    wide = frame.pivot_table(index=keys, columns="Year", values="value", aggfunc="sum")
+    wide = wide.reindex(columns=years)
+    labels = list(wide.index)
+    return labels, years, wide.to_numpy(dtype=np.float64)
+
+
+def series_metrics(years, matrix, window=TREND_ROLLING_WINDOW):
+    """
+    Compute trend metrics for every row of ``matrix`` in one batched pass.
+
+    Args:
+        years: 1-D array of years (matrix columns)
+        matrix: 2-D array, one series per row, NaN for missing years
+        window: Rolling-mean window in years
+
+    Returns:
+        Dictionary of arrays: yoy_growth, rolling_mean (same shape as matrix),
+        cagr, slope, first_year, last_year (one value per series)
+    """
+    years = np.asarray(years, dtype=np.float64)
+    present = ~np.isnan(matrix)
+    values = np.where(present, matrix, 0.0)
+
+    # Year-over-year growth (%) between consecutive columns
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yoy = (matrix[:, 1:] - matrix[:, :-1]) / np.abs(matrix[:, :-1]) * 100
+    yoy[~np.isfinite(yoy)] = np.nan
+
+    # Trailing rolling mean via cumulative sums, ignoring missing years
+    csum = np.cumsum(values, axis=1)
+    ccount = np.cumsum(present, axis=1)
+    if window < matrix.shape[1]:
+        csum[:, window:] = csum[:, window:] - csum[:, :-window]
+        ccount[:, window:] = ccount[:, window:] - ccount[:, :-window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rolling = np.where(ccount > 0, csum / ccount, np.nan)
+
+    # CAGR between the first and last observed year of each series
+    n_cols = matrix.shape[1]
+    has_any = present.any(axis=1)
+    first_idx = np.argmax(present, axis=1)
+    last_idx = n_cols - 1 - np.argmax(present[:, ::-1], axis=1)
+    rows = np.arange(matrix.shape[0])
+    first_val = matrix[rows, first_idx]
+    last_val = matrix[rows, last_idx]
+    span = years[last_idx] - years[first_idx]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = np.where(
+            has_any & (span > 0) & (first_val > 0) & (last_val > 0),
+            (last_val / first_val) ** (1.0 / np.where(span > 0, span, 1)) - 1,
+            np.nan,
+        )
+
+    # Least-squares slope over the observed points of each series
+    count = present.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = (present * years).sum(axis=1) / count
+        y_mean = values.sum(axis=1) / count
+        dx = np.where(present, years - x_mean[:, None], 0.0)
+        dy = np.where(present, matrix - y_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        slope = np.where((count >= 2) & (sxx > 0), (dx * dy).sum(axis=1) / sxx, np.nan)
+
+    return {
+        "yoy_growth": yoy,
+        "rolling_mean": rolling,
+        "cagr": cagr,
+        "slope": slope,
+        "mean": y_mean,
+        "first_year": np.where(has_any, years[first_idx], np.nan),
+        "last_year": np.where(has_any, years[last_idx], np.nan),
+    }
+
+
+def _round_list(values, digits=2):
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def _direction(slope, mean):
+    if np.isnan(slope) or not mean:
+        return "insufficient data"
+    relative = slope / abs(mean)
+    if relative > STABLE_THRESHOLD:
+        return "increasing"
+    if relative < -STABLE_THRESHOLD:
+        return "decreasing"
+    return "stable"
+
+
+def _series_records(keys, labels, years, matrix, metrics):
+    records = []
+    for i, label in enumerate(labels):
+        label = label if isinstance(label, tuple) else (label,)
+        record = dict(zip(keys, label))
+        record.update({
+            "Years": [int(y) for y in years],
+            "Values": _round_list(matrix[i]),
+            "YoY_Growth": [None] + _round_list(metrics["yoy_growth"][i]),
+            "Rolling_Mean": _round_list(metrics["rolling_mean"][i]),
+            "CAGR": None if np.isnan(metrics["cagr"][i]) else round(float(metrics["cagr"][i]) * 100, 2),
+            "Slope": None if np.isnan(metrics["slope"][i]) else round(float(metrics["slope"][i]), 2),
+            "Direction": _direction(metrics["slope"][i], metrics["mean"][i]),
+        })
+        records.append(record)
+    return records
+
+
+def _trend_table(index, keys, filters, years):
+    selected = index.select(filters, years)
+    selected = selected[selected["Year"] >= 0]
+    if selected.empty:
+        return []
+    frame = selected[keys + ["Year"]].copy()
+    if index.value == "Rainfall":
+        # Average rainfall per year (sum / observations), not the raw sum
+        frame["value"] = selected["sum"] / selected["count"]
+    else:
+        frame["value"] = selected["sum"]
+    labels, year_values, matrix = _pivot(frame, keys)
+    if matrix.shape[1] < 2:
+        return []
+    return _series_records(keys, labels, year_values, matrix, series_metrics(year_values, matrix))
+
+
+def analyze_trends(index, entities):
+    """
+    Compute rainfall and production trends for the parsed year window.
+
+    Every state (and state/crop) series is pivoted into one year-by-series
+    matrix and all metrics are computed on the whole matrix at once.
+
+    Args:
+        index: AnalyticsIndex for the current dataset versions
+        entities: Dictionary containing 'states', 'crops', 'years'
+
+    Returns:
+        Dictionary with 'rainfall_trends', 'production_trends' and 'window'
+    """
+    states = entities.get("states")
+    years = query_parser.year_window(entities)
+    crop_keys = ["State", "Crop"] if index.has_crop else ["State"]
+    return {
+        "window": years,
+        "rainfall_trends": _trend_table(index.rainfall, ["State"], {"State": states}, years),
+        "production_trends": _trend_table(
+            index.production, crop_keys, {"State": states, "Crop": entities.get("crops")}, years
+        ),
+    }
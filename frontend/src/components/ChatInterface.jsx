@@ -24,6 +24,16 @@ ChartJS.register(
   Title
 );
 
+// Age of the oldest live dataset, e.g. "3 h", or null when unknown
+const formatDataAge = (dataAge) => {
+  const ages = Object.values(dataAge || {}).filter((age) => typeof age === "number");
+  if (!ages.length) return null;
+  const seconds = Math.max(...ages);
+  if (seconds < 3600) return `${Math.max(1, Math.round(seconds / 60))} min`;
+  if (seconds < 86400) return `${Math.round(seconds / 3600)} h`;
+  return `${Math.round(seconds / 86400)} d`;
+};
+
 const ChatInterface = ({ initialQuery = "" }) => {
   const API_BASE = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
   const [query, setQuery] = useState("");
@@ -60,30 +70,78 @@ const ChatInterface = ({ initialQuery = "" }) => {
     setLoading(true);
     setError("");
 
+    // Placeholder assistant message, filled in as stream events arrive
+    const messageId = Date.now();
+    const updateAssistant = (patch) =>
+      setMessages((prev) =>
+        prev.map((m) => (m.id === messageId ? { ...m, ...patch(m) } : m))
+      );
+    setMessages((prev) => [
+      ...prev,
+      { id: messageId, type: "assistant", content: "Understanding your question…", pending: true },
+    ]);
+
+    const applyEvent = ({ event, data }) => {
+      switch (event) {
+        case "entities":
+          updateAssistant(() => ({ entities: data.entities, content: "Fetching data…" }));
+          break;
+        case "data_source":
+          updateAssistant(() => ({
+            dataSource: data.data_source,
+            dataAge: data.data_age,
+            citations: data.citations,
+            content: "Analyzing…",
+          }));
+          break;
+        case "summary":
+          updateAssistant(() => ({ content: data.summary || "No result found." }));
+          break;
+        case "done":
+          updateAssistant(() => ({ pending: false }));
+          break;
+        case "error":
+          throw new Error(data.detail);
+        default:
+          // rainfall_analysis, crop_analysis, correlation_analysis, ...
+          updateAssistant((m) => ({ analysis: { ...(m.analysis || {}), [event]: data } }));
+      }
+    };
+
     try {
-      const res = await fetch(`${API_BASE}/query`, {
+      const res = await fetch(`${API_BASE}/query/stream`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", Accept: "application/x-ndjson" },
         body: JSON.stringify({ query: finalQuery }),
       });
       if (!res.ok) {
         throw new Error(`HTTP error! status: ${res.status}`);
       }
-      const data = await res.json();
-      const assistantMessage = {
-        type: "assistant",
-        content: data.summary || "No result found.",
-        analysis: data.analysis,
-        entities: data.entities,
-        citations: data.citations,
-        dataSource: data.data_source,
-      };
-      setMessages((prev) => [...prev, assistantMessage]);
+      if (!res.body?.getReader) {
+        // No streaming support: read the whole NDJSON body at once
+        (await res.text()).split("\n").filter(Boolean).forEach((line) => applyEvent(JSON.parse(line)));
+      } else {
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffered += decoder.decode(value, { stream: true });
+          const lines = buffered.split("\n");
+          buffered = lines.pop();
+          lines.filter(Boolean).forEach((line) => applyEvent(JSON.parse(line)));
+        }
+        if (buffered.trim()) applyEvent(JSON.parse(buffered));
+      }
     } catch (error) {
       setError("Error connecting to the backend. Please try again.");
-      const errorMessage = { type: "error", content: `Error: ${error.message}` };
-      setMessages((prev) => [...prev, errorMessage]);
+      setMessages((prev) => [
+        ...prev.filter((m) => m.id !== messageId || !m.pending),
+        { type: "error", content: `Error: ${error.message}` },
+      ]);
     } finally {
+      updateAssistant(() => ({ pending: false }));
       setLoading(false);
     }
   };
@@ -190,10 +248,12 @@ const ChatInterface = ({ initialQuery = "" }) => {
                     : "bg-gray-100 text-gray-800 rounded-bl-none"
                 }`}
               >
-                <p className="text-sm">{msg.content}</p>
+                <p className={`text-sm ${msg.pending ? "animate-pulse" : ""}`}>{msg.content}</p>
                 {msg.type === "assistant" && msg.dataSource && (
                   <p className="text-xs mt-2 opacity-75">
                     Data source: {msg.dataSource}
+                    {msg.dataSource === "stale" && formatDataAge(msg.dataAge) &&
+                      ` (data.gov.in unavailable; last updated ${formatDataAge(msg.dataAge)} ago)`}
                   </p>
                 )}
               </div>